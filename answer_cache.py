@@ -0,0 +1,199 @@
+"""
+answer_cache.py
+---------------
+Semantic cache of LLM answers keyed by question embedding.
+A new question reuses a stored answer when it is a near-duplicate of a
+previously answered one and retrieval returned the same context chunks.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+import zipfile
+from typing import List, Optional
+
+import faiss
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Small FAISS inner-product index over answered questions.
+
+    Args:
+        dim (int): Embedding dimension of the (normalized) question vectors.
+        threshold (float): Minimum cosine similarity for a hit.
+        max_entries (int): Entries kept before the least recently used are evicted.
+        cache_dir (str): Directory for persistence; None keeps the cache in memory only.
+        version (str): Version of the document index the answers were built from;
+            a persisted cache from another version is discarded on load.
+    """
+
+    # Question vectors and entries in one file, so they are replaced together
+    CACHE_FILE = "answer_cache.npz"
+
+    def __init__(self, dim: int, threshold: float = 0.92, max_entries: int = 5000,
+                 cache_dir: Optional[str] = None, version: str = ""):
+        self.dim = dim
+        self.version = version
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.index = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+        self.entries = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if cache_dir:
+            self.load()
+
+    def lookup(self, query_vec: np.ndarray, context_ids: List[int], version: Optional[str] = None) -> Optional[str]:
+        """
+        Return a cached answer for a near-duplicate question with matching context, else None.
+        context_ids from another index version than the cache's (when given) always miss.
+        """
+        with self._lock:
+            if self.index.ntotal == 0 or (version is not None and version != self.version):
+                self.misses += 1
+                return None
+            k = min(4, self.index.ntotal)
+            D, I = self.index.search(np.ascontiguousarray(query_vec, dtype="float32"), k)
+            wanted = sorted(context_ids)
+            for score, entry_id in zip(D[0], I[0]):
+                if entry_id < 0 or score < self.threshold:
+                    break
+                entry = self.entries.get(int(entry_id))
+                if entry is not None and entry["context_ids"] == wanted:
+                    entry["last_used"] = time.time()
+                    self.hits += 1
+                    return entry["answer"]
+            self.misses += 1
+            return None
+
+    def add(self, query_vec: np.ndarray, question: str, answer: str, context_ids: List[int],
+            version: Optional[str] = None):
+        """
+        Store an answer, evicting least recently used entries past max_entries.
+        Answers built on another index version than the cache's (when given) are dropped.
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(
+                np.ascontiguousarray(query_vec, dtype="float32"), np.array([entry_id], dtype="int64")
+            )
+            self.entries[entry_id] = {
+                "question": question,
+                "answer": answer,
+                "context_ids": sorted(int(i) for i in context_ids),
+                "last_used": time.time(),
+            }
+            overflow = len(self.entries) - self.max_entries
+            if overflow > 0:
+                stale = sorted(self.entries, key=lambda i: self.entries[i]["last_used"])[:overflow]
+                self.index.remove_ids(np.array(stale, dtype="int64"))
+                for i in stale:
+                    del self.entries[i]
+                self.evictions += len(stale)
+
+    def _rows(self):
+        """(vector, entry) pairs of the in-memory cache; call with the lock held."""
+        if self.index.ntotal == 0:
+            return []
+        ids = faiss.vector_to_array(self.index.id_map)
+        vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        return [(vector, self.entries[int(i)]) for i, vector in zip(ids, vectors) if int(i) in self.entries]
+
+    def _write(self, path: str, rows):
+        """Write (vector, entry) rows to path atomically, as one file."""
+        vectors = np.array([vector for vector, _ in rows], dtype="float32").reshape(len(rows), self.dim)
+        meta = json.dumps({"version": self.version, "entries": [entry for _, entry in rows]})
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, vectors=vectors, meta=np.array(meta))
+        os.replace(path + ".tmp", path)
+
+    def _read(self, path: str):
+        """
+        (vector, entry) rows saved at path, or None if there is no usable cache
+        (missing, truncated or corrupt, another dimension or index version, vectors and entries out of step).
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                vectors, meta = data["vectors"], json.loads(str(data["meta"]))
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return None
+        if not isinstance(meta, dict) or vectors.ndim != 2 or vectors.shape[1] != self.dim or meta.get("version") != self.version:
+            return None
+        if len(meta.get("entries", [])) != len(vectors):
+            return None
+        return list(zip(vectors, meta["entries"]))
+
+    def save(self):
+        """
+        Persist the question vectors and entries atomically to cache_dir.
+
+        Several processes (serve.py workers) can share one cache_dir: under a
+        file lock, the entries on disk are merged with this process's ones (the
+        same question with the same context is kept once, most recently used
+        first) and the max_entries most recently used are written.
+        """
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, self.CACHE_FILE)
+        with self._lock:
+            rows = self._rows()
+        with open(path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            merged = {}
+            for vector, entry in (self._read(path) or []) + rows:
+                key = (entry["question"], tuple(entry["context_ids"]))
+                if key not in merged or entry["last_used"] >= merged[key][1]["last_used"]:
+                    merged[key] = (vector, entry)
+            rows = sorted(merged.values(), key=lambda row: row[1]["last_used"])
+            self._write(path, rows[-self.max_entries:] if self.max_entries > 0 else [])
+
+    def load(self):
+        """Restore a previously saved cache; a missing or mismatched cache starts empty."""
+        rows = self._read(os.path.join(self.cache_dir, self.CACHE_FILE))
+        if not rows:
+            return
+        with self._lock:
+            self.index.reset()
+            self.index.add_with_ids(np.array([vector for vector, _ in rows], dtype="float32"),
+                                    np.arange(len(rows), dtype="int64"))
+            self.entries = {i: entry for i, (_, entry) in enumerate(rows)}
+            self._next_id = len(rows)
+
+    def clear(self):
+        with self._lock:
+            self.index.reset()
+            self.entries.clear()
+
+    def reset(self, version: str):
+        """Drop every entry and start caching answers for another index version."""
+        with self._lock:
+            self.index.reset()
+            self.entries.clear()
+            self.version = version
+
+    def stats(self) -> dict:
+        """Snapshot of size and hit/miss/eviction counters."""
+        with self._lock:
+            return {
+                "size": len(self.entries),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
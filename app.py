@@ -1,76 +1,454 @@
 """
 app.py
 ------
-Flask-based RAG chatbot using FAISS, Pandas, and Mistral via OpenRouter.
+Flask-based RAG chatbot using FAISS, a memory-mapped chunk store, and Mistral via OpenRouter.
 Retrieves relevant document chunks from CapillaryDocs and generates AI responses.
 """
 
-from flask import Flask, render_template, request, jsonify
-import pandas as pd
+from flask import Flask, Response, render_template, request, jsonify
 import faiss
-import json
-from sentence_transformers import SentenceTransformer
 import numpy as np
-import requests
 import os
+import atexit
+import hmac
+import json
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+from embed_batcher import MicroBatchEmbedder
+from index_versions import IndexVersion, VersionedIndex
+from loader import ComponentLoader
+import metrics
+from llm_client import CONNECTION_ERROR, NO_RESPONSE, OpenRouterClient, sse_event
+from answer_cache import SemanticAnswerCache
+from context_packer import ContextPacker
+from rerank import CrossEncoderReranker, candidate_vectors, enable_reconstruct, mmr
+from query_cache import LRUCache, index_version, normalize_query
+from scripts.bm25_index import BM25Index, reciprocal_rank_fusion
+from scripts.artifact_versions import ARTIFACTS_DIR as DEFAULT_ARTIFACTS_DIR, current_version, list_versions, \
+    set_current_version, version_paths
+from scripts.chunk_store import ChunkStore, load_id_mapping, resolve_positions
+from scripts.manifest import check_manifest, load_manifest
 
 app = Flask(__name__)
 
 
-# File paths
+# File paths. A build with --version writes into ARTIFACTS_DIR/<version>/ and
+# ARTIFACTS_DIR/CURRENT names the version to serve; without CURRENT the
+# unversioned paths below are served.
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR", DEFAULT_ARTIFACTS_DIR)
 FAISS_INDEX_PATH = "faiss_index/capillary_chunks_index.faiss"
-CSV_PATH = "metadata/capillary_chunks_df.csv"
-ID_MAPPING_PATH = "metadata/capillary_chunks_id_mapping.json"
+CHUNK_STORE_PREFIX = "metadata/capillary_chunks"
+ID_MAPPING_PATH = "metadata/capillary_chunks_id_mapping.npy"
+MANIFEST_PATH = "metadata/build_manifest.json"
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Query embedder backend: "torch" (SentenceTransformer) or "onnx" (ONNX Runtime,
+# see scripts/export_onnx.py; never imports torch). ONNX_MODEL_FILE picks the
+# fp32 graph or its int8 quantization; by default the int8 one if it was exported.
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", f"models/{EMBED_MODEL_NAME}")
+ONNX_MODEL_FILE = os.getenv("ONNX_MODEL_FILE", "")
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "1"))
+
+
+
+# Optional query-time knobs for approximate indexes, e.g. "nprobe=32" or "efSearch=128"
+FAISS_SEARCH_PARAMS = os.getenv("FAISS_SEARCH_PARAMS", "")
+
+# Optional diversity re-ranking, off by default: with a factor > 1 (e.g. 4), over-fetch
+# MMR_FETCH_FACTOR * k candidates and keep k by MMR. Needs stored vectors, so IVF
+# indexes then get a direct map.
+MMR_FETCH_FACTOR = int(os.getenv("MMR_FETCH_FACTOR", "1"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))
+
+# Hybrid (lexical + dense) retrieval with the memory-mapped BM25 index, if the build made one
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+def _read_index(path: str):
+    index = faiss.read_index(path)
+    if FAISS_SEARCH_PARAMS:
+        faiss.ParameterSpace().set_index_parameters(index, FAISS_SEARCH_PARAMS)
+    if MMR_FETCH_FACTOR > 1:
+        enable_reconstruct(index)
+    return index
 
+def _read_bm25_index(prefix: str):
+    return BM25Index(prefix) if HYBRID_SEARCH and BM25Index.exists(prefix) else None
 
-# Load FAISS index
-index = faiss.read_index(FAISS_INDEX_PATH)
+def _timed(read, path: str):
+    start = time.perf_counter()
+    return read(path), round(time.perf_counter() - start, 3)
 
+def _version_paths(name: str) -> dict:
+    """Artifact paths of version name; name "" is the unversioned layout."""
+    if not name:
+        return {"index": FAISS_INDEX_PATH, "chunks": CHUNK_STORE_PREFIX, "id_mapping": ID_MAPPING_PATH,
+                "manifest": MANIFEST_PATH}
+    if name in list_versions(ARTIFACTS_DIR):
+        return version_paths(ARTIFACTS_DIR, name)
+    raise ValueError(f"No complete build named {name!r} in {ARTIFACTS_DIR}")
 
-# Load DataFrame
-df = pd.read_csv(CSV_PATH, index_col=0)
+def version_key(name: str) -> str:
+    """Keys the retrieval and answer caches; the unversioned key is the old INDEX_VERSION."""
+    key = index_version(_version_paths(name)["index"])
+    return f"{name}:{key}" if name else key
 
+def load_version(name: str) -> IndexVersion:
+    """
+    Read the FAISS index, chunk store (mmap), ID mapping and BM25 index (mmap)
+    of one version in parallel threads; name "" is the unversioned layout.
+    """
+    paths = _version_paths(name)
+    # Fingerprinted before reading, so a rewrite during the load shows up as a change
+    key = version_key(name)
+    readers = {
+        "index": (_read_index, paths["index"]),
+        "chunk_store": (ChunkStore, paths["chunks"]),
+        "id_mapping": (load_id_mapping, paths["id_mapping"]),
+        "bm25_index": (_read_bm25_index, paths["chunks"]),
+    }
+    with ThreadPoolExecutor(max_workers=len(readers), thread_name_prefix="load") as pool:
+        futures = {artifact: pool.submit(_timed, read, path) for artifact, (read, path) in readers.items()}
+        loaded = {artifact: future.result() for artifact, future in futures.items()}
+    return IndexVersion(
+        name,
+        key,
+        manifest=load_manifest(paths["manifest"]),
+        load_seconds={artifact: seconds for artifact, (_, seconds) in loaded.items()},
+        **{artifact: value for artifact, (value, _) in loaded.items()},
+    )
+
+
+# Embedding model (torch / sentence_transformers or onnxruntime are imported here,
+# in the loading thread), behind a batcher that merges concurrent /chat queries
+# into one forward pass
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "2"))
+embed_model = embed_model_name = query_embedder = None
+
+def _load_embed_model():
+    global embed_model, embed_model_name, query_embedder
+    if EMBED_BACKEND == "onnx":
+        from onnx_embedder import OnnxEmbedder, default_model_file
+        embed_model = OnnxEmbedder(ONNX_MODEL_DIR, ONNX_MODEL_FILE or default_model_file(ONNX_MODEL_DIR),
+                                   threads=ONNX_THREADS)
+        embed_model_name = embed_model.model_name
+    else:
+        from sentence_transformers import SentenceTransformer
+        embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+        embed_model_name = EMBED_MODEL_NAME
+    query_embedder = MicroBatchEmbedder(embed_model, max_batch_size=EMBED_MAX_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS)
+
+def _restart_query_embedder():
+    # A forked worker (serve.py preloads this module) inherits the batcher but not its thread
+    global query_embedder
+    if query_embedder is not None:
+        query_embedder = MicroBatchEmbedder(embed_model, max_batch_size=EMBED_MAX_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS)
 
-# Load ID mapping
-with open(ID_MAPPING_PATH, "r", encoding="utf-8") as f:
-    id_mapping = json.load(f)
+os.register_at_fork(after_in_child=_restart_query_embedder)
 
 
-# Load embedding model
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
+# Optional cross-encoder re-ranking of RERANK_CANDIDATES chunks down to RERANK_TOP_K,
+# within RERANK_BUDGET_MS; past the budget the request keeps the order above
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")  # e.g. cross-encoder/ms-marco-MiniLM-L-6-v2
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "3"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+reranker = None
+
+def _load_reranker():
+    global reranker
+    reranker = CrossEncoderReranker(RERANK_MODEL, budget_ms=RERANK_BUDGET_MS)
+
+
+# Refuse to serve artifacts that do not come from the same build
+def check_version(version: IndexVersion):
+    index, chunk_store, id_mapping, bm25_index = (version.index, version.chunk_store, version.id_mapping,
+                                                  version.bm25_index)
+    manifest_problems = check_manifest(
+        version.manifest,
+        model=embed_model_name,
+        dim=index.d,
+        n_vectors=index.ntotal,
+        n_chunks=len(chunk_store),
+    )
+    if len(id_mapping) != len(chunk_store):
+        manifest_problems.append(f"id mapping has {len(id_mapping)} entries for {len(chunk_store)} chunks")
+    if bm25_index is not None and len(bm25_index) > index.ntotal:
+        manifest_problems.append(f"BM25 index has {len(bm25_index)} chunks for {index.ntotal} vectors")
+    if manifest_problems:
+        raise RuntimeError(f"Inconsistent RAG artifacts in version {version.name!r}; rebuild with "
+                           "build_rag_pipeline.py:\n  " + "\n  ".join(manifest_problems))
+
+
+# Cache of (normalized query vector, top-k ids) keyed per index version
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+retrieval_cache = LRUCache(max_size=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+
+
+# Semantic answer cache: reuse answers to paraphrased questions with the same context
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "5000"))
+ANSWER_CACHE_DIR = os.getenv("ANSWER_CACHE_DIR", "cache")
+answer_cache = None
+
+def _load_answer_cache():
+    global answer_cache
+    answer_cache = SemanticAnswerCache(
+        versions.active.index.d,
+        threshold=ANSWER_CACHE_THRESHOLD,
+        max_entries=ANSWER_CACHE_SIZE,
+        cache_dir=ANSWER_CACHE_DIR or None,
+        version=versions.active.key,
+    )
+    atexit.register(answer_cache.save)
+
+
+# Pack retrieved chunks into a prompt token budget (tokens counted with the
+# embedding model's tokenizer, already in memory, as a proxy for the LLM's)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MIN_TOKENS = int(os.getenv("CONTEXT_MIN_TOKENS", "32"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+def count_tokens(text: str) -> int:
+    if EMBED_BACKEND == "onnx":
+        return embed_model.count_tokens(text)
+    return len(embed_model.tokenizer(text, add_special_tokens=False, verbose=False)["input_ids"])
+
+context_packer = ContextPacker(
+    count_tokens,
+    budget=CONTEXT_TOKEN_BUDGET,
+    min_tokens=CONTEXT_MIN_TOKENS,
+    dedup_threshold=CONTEXT_DEDUP_THRESHOLD,
+)
+
+
+# One dummy query through every stage, so lazily created thread pools, tokenizer
+# state and first-touched mmap pages are paid for before a version is served
+def warm_up(version: IndexVersion):
+    query_vec = query_embedder.encode(["warm up query"])
+    version.index.search(query_vec / np.linalg.norm(query_vec, axis=1, keepdims=True), 1)
+    if version.bm25_index is not None:
+        version.bm25_index.search("warm up query", 1)
+    version.chunk_store.get_many(resolve_positions(version.id_mapping, [0]))
+    count_tokens("warm up query")
+
+
+# The served index version. Swapping in another one loads, checks and warms it
+# up in the calling thread; requests in flight keep the version they started with.
+def _prepare_version(name: str) -> IndexVersion:
+    version = load_version(name)
+    check_version(version)
+    warm_up(version)
+    return version
+
+versions = VersionedIndex(_prepare_version, key=version_key)
+
+def reload_artifacts(name: Optional[str] = None) -> dict:
+    """Swap in version name, by default the one ARTIFACTS_DIR/CURRENT names."""
+    if name is None:
+        name = current_version(ARTIFACTS_DIR) or ""
+    result = versions.reload(name)
+    if result["swapped"]:
+        answer_cache.reset(versions.active.key)
+    return result
+
+def _reload_logged():
+    try:
+        result = reload_artifacts()
+    except Exception:
+        app.logger.exception("Index reload failed; still serving version %r", versions.active.name)
+        return
+    if result["swapped"]:
+        app.logger.info("Now serving index version %r (was %r)", result["active"], result["previous"])
+
+def server_status() -> dict:
+    """Loader status plus the served index version, for /healthz and /readyz."""
+    return {**loader.status(), "index": versions.stats()}
+
+# Other processes serving the same artifacts, which a reload must reach too;
+# serve.py sets this to the pids of the worker's siblings
+reload_peers: Callable[[], List[int]] = lambda: []
+
+def reload_all(name: Optional[str] = None) -> dict:
+    """
+    Swap in version name (default: the one ARTIFACTS_DIR/CURRENT names) in this
+    process, make it CURRENT, then send SIGHUP to reload_peers() so that every
+    worker follows. Peers reload in the background; their errors show in their
+    own /healthz.
+    """
+    current = current_version(ARTIFACTS_DIR) or ""
+    if name is not None and name != current and name not in list_versions(ARTIFACTS_DIR):
+        raise ValueError(f"No complete build named {name!r} in {ARTIFACTS_DIR}")
+    result = reload_artifacts(name)
+    if name is not None and name != current:
+        set_current_version(ARTIFACTS_DIR, name)
+    signalled = 0
+    for pid in reload_peers():
+        try:
+            os.kill(pid, signal.SIGHUP)
+            signalled += 1
+        except ProcessLookupError:
+            pass  # exited since it was listed
+    return {**result, "peers_signalled": signalled}
+
+# Admin endpoints are disabled unless ADMIN_TOKEN is set, and need X-Admin-Token == ADMIN_TOKEN
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def is_admin(token: str) -> bool:
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+def reload_request_version(body: bytes) -> Optional[str]:
+    """Version named by an /admin/reload body ({"version": name}, or empty); raises ValueError if malformed."""
+    if not body.strip():
+        return None
+    data = json.loads(body)
+    if not isinstance(data, dict) or not isinstance(data.get("version", ""), str):
+        raise ValueError('expected {"version": "<name>"}')
+    return data.get("version")
+
+def reload_in_background(*_):
+    """Follow ARTIFACTS_DIR/CURRENT in a background thread (also the SIGHUP handler)."""
+    if loader.ready():
+        threading.Thread(target=_reload_logged, name="reload-index", daemon=True).start()
+
+def install_reload_signal():
+    """Reload on SIGHUP; must be called from the main thread (serve.py does it per worker)."""
+    signal.signal(signal.SIGHUP, reload_in_background)
+
+if threading.current_thread() is threading.main_thread():
+    install_reload_signal()
+
+
+# Load the components above in parallel background threads; requests other than
+# the page itself and the health checks get 503 until all of them are ready
+loader = ComponentLoader()
+loader.add("artifacts", lambda: versions.activate(load_version(current_version(ARTIFACTS_DIR) or "")))
+loader.add("embed_model", _load_embed_model)
+if RERANK_MODEL:
+    loader.add("reranker", _load_reranker)
+loader.add("answer_cache", _load_answer_cache, after=["artifacts"])
+loader.add("artifact_check", lambda: check_version(versions.active), after=["artifacts", "embed_model"])
+loader.add("warmup", lambda: warm_up(versions.active), after=["artifact_check"])
+loader.start()
 
 
 # OpenRouter API settings
 OPENROUTER_API_KEY = "YOUR_OPENROUTER_KEY"
 MISTRAL_MODEL = "mistralai/mistral-small-3.2-24b-instruct:free"
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "32"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+llm_client = OpenRouterClient(
+    OPENROUTER_API_KEY,
+    MISTRAL_MODEL,
+    pool_size=LLM_POOL_SIZE,
+    connect_timeout=LLM_CONNECT_TIMEOUT,
+    read_timeout=LLM_READ_TIMEOUT,
+)
 
 
 # Helper functions
-def query_mistral(prompt: str) -> str:
-    """Send prompt to Mistral via OpenRouter and return the response."""
-    url = "https://openrouter.ai/api/v1/completions"
-    headers = {"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"}
-    payload = {"model": MISTRAL_MODEL, "prompt": prompt, "max_tokens": 1250, "temperature": 0.7}
+def query_mistral(prompt: str, usage: Optional[dict] = None) -> str:
+    """Send prompt to Mistral via OpenRouter and return the response; reported token counts go into usage."""
+    return llm_client.complete(prompt, usage)
 
-    try:
-        resp = requests.post(url, headers=headers, json=payload)
-        data = resp.json()
-        # Extract text safely
-        choices = data.get("choices", [])
-        if choices and "text" in choices[0]:
-            return choices[0]["text"].strip()
-        return "No response from model."
-    except Exception as e:
-        print("Error querying Mistral:", e)
-        return "Error connecting to model."
+def search_index(query: str, top_k: int = 5, artifacts: Optional[IndexVersion] = None):
+    """
+    Return the normalized query vector and top-k FAISS positions in artifacts (default:
+    the active index version), using the retrieval cache.
+    With a BM25 index, dense and lexical candidates are merged by reciprocal rank fusion;
+    with a cross-encoder, RERANK_TOP_K chunks are kept by its scores if they arrive in
+    time; with MMR_FETCH_FACTOR > 1 the final chunks are picked by MMR from a larger
+    candidate set.
+    """
+    artifacts = artifacts or versions.active
+    index, bm25_index, chunk_store, id_mapping = (artifacts.index, artifacts.bm25_index, artifacts.chunk_store,
+                                                  artifacts.id_mapping)
+    key = (artifacts.key, normalize_query(query), top_k)
+    cached = retrieval_cache.get(key)
+    metrics.cache_result("retrieval", cached is not None)
+    if cached is None:
+        with metrics.stage("embed"):
+            query_vec = query_embedder.encode([query])
+            query_vec = query_vec / np.linalg.norm(query_vec, axis=1, keepdims=True)
+        n_candidates = top_k * max(MMR_FETCH_FACTOR, 1)
+        if reranker is not None:
+            n_candidates = max(n_candidates, RERANK_CANDIDATES)
+        with metrics.stage("faiss"):
+            _, I = index.search(query_vec, n_candidates)
+        labels, relevance = I[0][I[0] >= 0], None
+        if bm25_index is not None:
+            with metrics.stage("bm25"):
+                lexical, _ = bm25_index.search(query, n_candidates)
+                labels, relevance = reciprocal_rank_fusion([labels, lexical], RRF_K)
+            labels, relevance = labels[:n_candidates], relevance[:n_candidates]
+        k, reranked = top_k, False
+        if reranker is not None and len(labels):
+            with metrics.stage("rerank"):
+                scores = reranker.scores(query, chunk_store.get_many(resolve_positions(id_mapping, labels)))
+            if scores is not None:
+                k, reranked, relevance = min(top_k, RERANK_TOP_K), True, scores
+                if MMR_FETCH_FACTOR <= 1:
+                    labels = labels[np.argsort(-scores, kind="stable")]
+        if MMR_FETCH_FACTOR > 1:
+            with metrics.stage("mmr"):
+                picked = mmr(query_vec, candidate_vectors(index, labels), k, MMR_LAMBDA, relevance=relevance)
+            ids = labels[picked].tolist()
+        else:
+            ids = labels[:k].tolist()
+        # A result that missed the re-ranking budget is served but not cached
+        if reranker is None or reranked:
+            retrieval_cache.put(key, (query_vec, ids))
+        return query_vec, ids
+    return cached
+
+def fetch_context(ids, artifacts: Optional[IndexVersion] = None):
+    """
+    Look up chunk texts for FAISS positions (in the same index version that
+    search_index used) and pack them, in relevance order,
+    into one context string within CONTEXT_TOKEN_BUDGET (see ContextPacker).
+    Chunks from page-aware builds are labelled [n] by source page so the model can
+    cite them. Returns the context, the list of {n, title, url} sources actually
+    used, and the packing counts.
+    """
+    artifacts = artifacts or versions.active
+    chunk_store = artifacts.chunk_store
+    with metrics.stage("chunks"):
+        chunk_ids = [int(chunk_id) for chunk_id in resolve_positions(artifacts.id_mapping, ids)]
+        candidates = [chunk_store.source(chunk_id) for chunk_id in chunk_ids]
+        chunk_texts = chunk_store.get_many(chunk_ids)
+    headers = ["" if source is None else f"[{i + 1}] {source['title']} ({source['url']})\n"
+               for i, source in enumerate(candidates)]
+    with metrics.stage("pack"):
+        chosen, texts, packing = context_packer.pack(list(zip(headers, chunk_texts)))
+
+    results, sources, numbers = [], [], {}
+    for i, text in zip(chosen, texts):
+        source = candidates[i]
+        if source is None:
+            results.append(text)
+            continue
+        if source["url"] not in numbers:
+            numbers[source["url"]] = len(numbers) + 1
+            sources.append({"n": numbers[source["url"]], "title": source["title"], "url": source["url"]})
+        results.append(f"[{numbers[source['url']]}] {source['title']} ({source['url']})\n{text}")
+    return "\n\n".join(results), sources, packing
+
+def fetch_chunks(ids, artifacts: Optional[IndexVersion] = None) -> str:
+    """Look up chunk texts for FAISS positions and join them into one context string."""
+    return fetch_context(ids, artifacts)[0]
 
 def retrieve_docs(query: str, top_k: int = 5) -> str:
     """Retrieve top-k relevant document chunks from FAISS index."""
-    query_vec = embed_model.encode([query])
-    query_vec = query_vec / np.linalg.norm(query_vec, axis=1, keepdims=True)
-    _, I = index.search(query_vec, top_k)
-    results = [df.loc[int(id_mapping.get(str(idx)))]["text"] for idx in I[0] if str(idx) in id_mapping]
-    return "\n\n".join(results)
+    artifacts = versions.active
+    _, ids = search_index(query, top_k, artifacts)
+    return fetch_chunks(ids, artifacts)
 
 def build_prompt(user_input: str, context: str) -> str:
     """Build a structured prompt for detailed, step-by-step answers."""
@@ -80,30 +458,161 @@ def build_prompt(user_input: str, context: str) -> str:
         "You are HelperBot, an AI assistant for Capillary Technologies documentation.\n"
         "Using the context below, provide a **detailed, step-by-step, structured answer** to the user's question.\n"
         "Include headings, numbered steps, API endpoints if relevant, and explain clearly so a user can follow instructions.\n"
-        "If the answer is not found in the context, respond politely that you don't know.\n\n"
+        "If the answer is not found in the context, respond politely that you don't know.\n"
+        "When context passages are labelled [n], cite the ones you use inline as [n].\n\n"
         f"Context:\n{context}\n\n"
         f"User Question:\n{user_input}\n\n"
         "Answer:"
     )
 
+def prepare_prompt(user_input: str, context: str, packing: dict):
+    """Build the prompt and record its token count; returns the prompt and a usage dict."""
+    with metrics.stage("prompt"):
+        prompt = build_prompt(user_input, context)
+        usage = {
+            "prompt_tokens": context_packer.record_prompt(prompt, packing["context_tokens"]),
+            "context_tokens": packing["context_tokens"],
+            "passages": packing["packed"],
+        }
+    app.logger.info("prompt_tokens=%d context_tokens=%d passages=%d trimmed=%d duplicates=%d over_budget=%d",
+                    usage["prompt_tokens"], usage["context_tokens"], packing["packed"], packing["trimmed"],
+                    packing["duplicates"], packing["over_budget"])
+    return prompt, usage
+
+def lookup_answer(query_vec, ids, artifacts: IndexVersion):
+    """Answer-cache lookup for a request's question and retrieved chunks, counted in the metrics."""
+    with metrics.stage("answer_cache"):
+        answer = answer_cache.lookup(query_vec, ids, version=artifacts.key)
+    metrics.cache_result("answer", answer is not None)
+    return answer
+
+def record_completion(answer: str, usage: dict, reported: dict):
+    """
+    Count the tokens of one LLM call, or the kind of error it ended with. Token
+    counts are the ones OpenRouter reported; without them, the prompt's estimate
+    from prepare_prompt and an estimate of the answer (tokenized, ~0.7 ms) are used.
+    """
+    completion = 0
+    if answer == CONNECTION_ERROR:
+        metrics.llm_error("connection")
+    elif answer in (NO_RESPONSE, ""):
+        metrics.llm_error("no_response")
+    else:
+        completion = reported.get("completion_tokens") or count_tokens(answer)
+    metrics.tokens(reported.get("prompt_tokens") or usage["prompt_tokens"], completion)
+
 
 # Flask routes
+@app.before_request
+def require_ready():
+    """Answer 503 while components are still loading (or failed to load)."""
+    if request.endpoint in ("home", "healthz", "readyz", "metrics_endpoint", "static") or loader.ready():
+        return None
+    return jsonify({"error": "Service is starting up", **server_status()}), 503, {"Retry-After": "1"}
+
 @app.route("/")
 def home():
     return render_template("index.html")
 
+@app.route("/healthz")
+def healthz():
+    """Liveness: the process serves requests; reports per-component load state and time."""
+    return jsonify(server_status())
+
+@app.route("/readyz")
+def readyz():
+    """Readiness: 200 once every component has loaded and warmed up, 503 before."""
+    status = server_status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics (see metrics.py)."""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    """Activate {"version": name}, or reload the version ARTIFACTS_DIR/CURRENT names, in every worker."""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Not found"}), 404
+    if not is_admin(request.headers.get("X-Admin-Token", "")):
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        name = reload_request_version(request.get_data())
+    except ValueError as e:
+        return jsonify({"error": f"Bad request body: {e}"}), 400
+    try:
+        result = reload_all(name)
+    except Exception as e:
+        return jsonify({"error": f"{type(e).__name__}: {e}", "index": versions.stats()}), 409
+    return jsonify({**result, "index": versions.stats()})
+
 @app.route("/chat", methods=["POST"])
 def chat():
+    with metrics.request("chat"):
+        user_input = request.json.get("message", "").strip()
+        if not user_input:
+            return jsonify({"answer": "Please enter a valid question."})
+
+        artifacts = versions.active  # one index version for the whole request
+        query_vec, ids = search_index(user_input, 5, artifacts)
+        context, sources, packing = fetch_context(ids, artifacts)
+        answer = lookup_answer(query_vec, ids, artifacts)
+        usage = {"prompt_tokens": 0, "context_tokens": 0, "passages": 0}  # answered from cache
+        if answer is None:
+            prompt, usage = prepare_prompt(user_input, context, packing)
+            reported = {}
+            with metrics.stage("llm"):
+                answer = query_mistral(prompt, reported)
+            record_completion(answer, usage, reported)
+            if answer not in (NO_RESPONSE, CONNECTION_ERROR):
+                answer_cache.add(query_vec, user_input, answer, ids, version=artifacts.key)
+
+        # Send raw Markdown/HTML for frontend to render
+        return jsonify({"answer": answer, "sources": sources, "usage": usage})
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Same as /chat, but forwards completion tokens as server-sent events."""
     user_input = request.json.get("message", "").strip()
-    if not user_input:
-        return jsonify({"answer": "Please enter a valid question."})
-    
-    context = retrieve_docs(user_input, top_k=5)
-    prompt = build_prompt(user_input, context)
-    answer = query_mistral(prompt)
-    
-    # Send raw Markdown/HTML for frontend to render
-    return jsonify({"answer": answer})
+
+    def generate():
+        # Timed until the last event is sent, or until the client disconnects
+        with metrics.request("chat_stream"):
+            if not user_input:
+                yield sse_event({"token": "Please enter a valid question."})
+                yield sse_event({"done": True})
+                return
+            artifacts = versions.active  # one index version for the whole request
+            query_vec, ids = search_index(user_input, 5, artifacts)
+            context, sources, packing = fetch_context(ids, artifacts)
+            yield sse_event({"sources": sources})
+            answer = lookup_answer(query_vec, ids, artifacts)
+            usage = {"prompt_tokens": 0, "context_tokens": 0, "passages": 0}
+            if answer is not None:
+                yield sse_event({"token": answer})
+            else:
+                prompt, usage = prepare_prompt(user_input, context, packing)
+                parts, reported, sent = [], {}, time.perf_counter()
+                with metrics.stage("llm"):
+                    for delta in llm_client.stream(prompt, reported):
+                        if not parts and delta != CONNECTION_ERROR:
+                            metrics.first_token(time.perf_counter() - sent)
+                        parts.append(delta)
+                        yield sse_event({"token": delta})
+                answer = "".join(parts).strip()
+                record_completion(CONNECTION_ERROR if CONNECTION_ERROR in parts else answer, usage, reported)
+                if answer and CONNECTION_ERROR not in parts:
+                    answer_cache.add(query_vec, user_input, answer, ids, version=artifacts.key)
+            yield sse_event({"done": True, "usage": usage})
+
+    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify({"retrieval": retrieval_cache.stats(), "answers": answer_cache.stats(), "prompts": context_packer.stats(),
+                    "rerank": reranker.stats() if reranker else None})
 
 
 # Run Flask app
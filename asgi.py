@@ -0,0 +1,174 @@
+"""
+asgi.py
+-------
+Async serving mode for the RAG chatbot.
+Reuses the index, caches and retrieval helpers loaded by app.py, but serves
+/chat from an asyncio event loop with a pooled async client to OpenRouter,
+so one process can hold hundreds of in-flight chats.
+
+Run with:  uvicorn asgi:app --host 0.0.0.0 --port 8000
+"""
+
+import contextlib
+import time
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.templating import Jinja2Templates
+
+import app as rag
+import metrics
+from llm_client import AsyncOpenRouterClient, sse_event
+
+templates = Jinja2Templates(directory="templates")
+llm = None
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    global llm
+    llm = AsyncOpenRouterClient(
+        rag.OPENROUTER_API_KEY,
+        rag.MISTRAL_MODEL,
+        pool_size=rag.LLM_POOL_SIZE,
+        connect_timeout=rag.LLM_CONNECT_TIMEOUT,
+        read_timeout=rag.LLM_READ_TIMEOUT,
+    )
+    yield
+    await llm.aclose()
+
+
+def not_ready():
+    """503 response while app.py is still loading its components, else None."""
+    if rag.loader.ready():
+        return None
+    return JSONResponse({"error": "Service is starting up", **rag.server_status()}, status_code=503,
+                        headers={"Retry-After": "1"})
+
+
+async def home(request: Request):
+    return templates.TemplateResponse(request, "index.html")
+
+
+async def healthz(request: Request):
+    return JSONResponse(rag.server_status())
+
+
+async def readyz(request: Request):
+    status = rag.server_status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+async def metrics_endpoint(request: Request):
+    body, content_type = metrics.render()
+    return Response(body, headers={"Content-Type": content_type})
+
+
+async def admin_reload(request: Request):
+    if not rag.ADMIN_TOKEN:
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    if not rag.is_admin(request.headers.get("X-Admin-Token", "")):
+        return JSONResponse({"error": "Forbidden"}, status_code=403)
+    if (response := not_ready()) is not None:
+        return response
+    try:
+        name = rag.reload_request_version(await request.body())
+    except ValueError as e:
+        return JSONResponse({"error": f"Bad request body: {e}"}, status_code=400)
+    # Loading the new version is blocking work; requests keep flowing meanwhile
+    try:
+        result = await run_in_threadpool(rag.reload_all, name)
+    except Exception as e:
+        return JSONResponse({"error": f"{type(e).__name__}: {e}", "index": rag.versions.stats()}, status_code=409)
+    return JSONResponse({**result, "index": rag.versions.stats()})
+
+
+async def chat(request: Request):
+    if (response := not_ready()) is not None:
+        return response
+    with metrics.request("chat"):
+        body = await request.json()
+        user_input = body.get("message", "").strip()
+        if not user_input:
+            return JSONResponse({"answer": "Please enter a valid question."})
+
+        # Embedding and FAISS search are CPU-bound; keep them off the event loop
+        artifacts = rag.versions.active  # one index version for the whole request
+        query_vec, ids = await run_in_threadpool(rag.search_index, user_input, 5, artifacts)
+        context, sources, packing = await run_in_threadpool(rag.fetch_context, ids, artifacts)
+        answer = rag.lookup_answer(query_vec, ids, artifacts)
+        usage = {"prompt_tokens": 0, "context_tokens": 0, "passages": 0}  # answered from cache
+        if answer is None:
+            prompt, usage = await run_in_threadpool(rag.prepare_prompt, user_input, context, packing)
+            reported = {}
+            with metrics.stage("llm"):
+                answer = await llm.complete(prompt, reported)
+            rag.record_completion(answer, usage, reported)
+            if answer not in (rag.NO_RESPONSE, rag.CONNECTION_ERROR):
+                rag.answer_cache.add(query_vec, user_input, answer, ids, version=artifacts.key)
+
+        return JSONResponse({"answer": answer, "sources": sources, "usage": usage})
+
+
+async def chat_stream(request: Request):
+    if (response := not_ready()) is not None:
+        return response
+    body = await request.json()
+    user_input = body.get("message", "").strip()
+
+    async def generate():
+        with metrics.request("chat_stream"):
+            if not user_input:
+                yield sse_event({"token": "Please enter a valid question."})
+                yield sse_event({"done": True})
+                return
+            artifacts = rag.versions.active
+            query_vec, ids = await run_in_threadpool(rag.search_index, user_input, 5, artifacts)
+            context, sources, packing = await run_in_threadpool(rag.fetch_context, ids, artifacts)
+            yield sse_event({"sources": sources})
+            answer = rag.lookup_answer(query_vec, ids, artifacts)
+            usage = {"prompt_tokens": 0, "context_tokens": 0, "passages": 0}
+            if answer is not None:
+                yield sse_event({"token": answer})
+            else:
+                prompt, usage = await run_in_threadpool(rag.prepare_prompt, user_input, context, packing)
+                parts, reported, sent = [], {}, time.perf_counter()
+                with metrics.stage("llm"):
+                    async for delta in llm.stream(prompt, reported):
+                        if not parts and delta != rag.CONNECTION_ERROR:
+                            metrics.first_token(time.perf_counter() - sent)
+                        parts.append(delta)
+                        yield sse_event({"token": delta})
+                answer = "".join(parts).strip()
+                rag.record_completion(rag.CONNECTION_ERROR if rag.CONNECTION_ERROR in parts else answer, usage,
+                                      reported)
+                if answer and rag.CONNECTION_ERROR not in parts:
+                    rag.answer_cache.add(query_vec, user_input, answer, ids, version=artifacts.key)
+            yield sse_event({"done": True, "usage": usage})
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+async def cache_stats(request: Request):
+    if (response := not_ready()) is not None:
+        return response
+    return JSONResponse({"retrieval": rag.retrieval_cache.stats(), "answers": rag.answer_cache.stats(),
+                         "prompts": rag.context_packer.stats(), "rerank": rag.reranker.stats() if rag.reranker else None})
+
+
+app = Starlette(
+    routes=[
+        Route("/", home),
+        Route("/healthz", healthz),
+        Route("/readyz", readyz),
+        Route("/chat", chat, methods=["POST"]),
+        Route("/chat/stream", chat_stream, methods=["POST"]),
+        Route("/cache/stats", cache_stats),
+        Route("/metrics", metrics_endpoint),
+        Route("/admin/reload", admin_reload, methods=["POST"]),
+    ],
+    lifespan=lifespan,
+)
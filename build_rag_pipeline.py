@@ -0,0 +1,154 @@
+"""
+build_rag_pipeline.py
+---------------------
+Single-pass build of every artifact app.py loads.
+Streams the scraped corpus page by page, chunks it once into the chunk store,
+and feeds that store to the ID mapping, the BM25 index and the FAISS index
+(and, with --csv, a DataFrame CSV of the chunks for inspection), so memory
+stays bounded no matter how large the corpus is. Each artifact is written
+atomically, and a build manifest (corpus hash, chunk parameters, model,
+counts) is written last so the server can verify that the artifacts it
+loads came from the same build.
+
+Usage:
+    python build_rag_pipeline.py [--chunking tokens] [--max-tokens 256] [--overlap-tokens 32] [--index-type flat]
+    python build_rag_pipeline.py --version --activate   # build artifacts/<timestamp>/ for a hot swap
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import faiss
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+
+from bm25_index import write_bm25_index  # noqa: E402
+from chunk_store import ChunkStore  # noqa: E402
+from dataframe_utils import create_dataframe  # noqa: E402
+from embedding_index import INDEX_TYPES, build_faiss_index  # noqa: E402
+from ingest import iter_pages  # noqa: E402
+from artifact_versions import ARTIFACTS_DIR, new_version_name, set_current_version, version_paths  # noqa: E402
+from manifest import file_sha256, write_manifest  # noqa: E402
+from token_chunking import (MAX_SEQ_TOKENS, format_report, iter_build_chunks, load_tokenizer,  # noqa: E402
+                            truncation_report)
+
+DATA_PATH = "data/capillary_docs.json"
+FAISS_INDEX_PATH = "faiss_index/capillary_chunks_index.faiss"
+CSV_PATH = "metadata/capillary_chunks_df.csv"
+ID_MAPPING_PATH = "metadata/capillary_chunks_id_mapping.npy"
+CHUNK_STORE_PREFIX = "metadata/capillary_chunks"
+MANIFEST_PATH = "metadata/build_manifest.json"
+
+# Unversioned layout, used when no --version is given
+LEGACY_PATHS = {
+    "index": FAISS_INDEX_PATH,
+    "csv": CSV_PATH,
+    "id_mapping": ID_MAPPING_PATH,
+    "chunks": CHUNK_STORE_PREFIX,
+    "manifest": MANIFEST_PATH,
+}
+
+
+def build(data_path: str, chunk_size: int, overlap: int, model_name: str, index_type: str, cache_dir: str,
+          chunk_workers: int = 1, chunking: str = "tokens", max_tokens: int = MAX_SEQ_TOKENS,
+          overlap_tokens: int = 32, embed_workers: int = 1, paths: dict = None, csv: bool = False) -> dict:
+    """
+    Run the whole pipeline and return the manifest it wrote.
+    paths (see artifact_versions.version_paths) defaults to LEGACY_PATHS;
+    csv also writes the chunks to paths["csv"].
+    """
+    paths = paths or LEGACY_PATHS
+    start = time.perf_counter()
+    # A half-finished build must not leave behind a manifest vouching for it
+    if os.path.exists(paths["manifest"]):
+        os.remove(paths["manifest"])
+
+    # 1. Stream raw corpus (once), counting pages as they go by
+    n_pages = 0
+
+    def pages():
+        nonlocal n_pages
+        for page in iter_pages(data_path):
+            n_pages += 1
+            yield page
+
+    # 2. Chunk (once) straight into the chunk store, then the ID mapping (and CSV).
+    #    (see token_chunking.iter_build_chunks for the --chunking modes).
+    os.makedirs(os.path.dirname(paths["chunks"]), exist_ok=True)
+    chunks = iter_build_chunks(pages(), chunking, chunk_size=chunk_size, overlap=overlap, model=model_name,
+                               max_tokens=max_tokens, overlap_tokens=overlap_tokens, workers=chunk_workers)
+    n_chunks = create_dataframe(chunks, save_mapping_path=paths["id_mapping"], save_store_prefix=paths["chunks"],
+                                save_csv_path=paths["csv"] if csv else None)
+    print(f"{n_pages} pages -> {n_chunks} chunks")
+    # How much of each chunk the embedding model will actually see
+    report = truncation_report(ChunkStore(paths["chunks"]), load_tokenizer(model_name), MAX_SEQ_TOKENS)
+    print(format_report(report, MAX_SEQ_TOKENS))
+
+    # Lexical index for hybrid retrieval; chunk ID = FAISS position in a full build
+    write_bm25_index(ChunkStore(paths["chunks"]), paths["chunks"])
+
+    # 3. Embed + index, reading chunk texts back from the memory-mapped store
+    index, _ = build_faiss_index(ChunkStore(paths["chunks"]), model_name=model_name, index_type=index_type,
+                                 cache_dir=cache_dir, workers=embed_workers)
+    os.makedirs(os.path.dirname(paths["index"]), exist_ok=True)
+    faiss.write_index(index, paths["index"] + ".tmp")
+    os.replace(paths["index"] + ".tmp", paths["index"])
+
+    # 4. Manifest last: its presence means every artifact above is complete
+    manifest = write_manifest(
+        paths["manifest"],
+        corpus_path=data_path,
+        corpus_sha256=file_sha256(data_path),
+        n_pages=n_pages,
+        chunking=chunking,
+        chunk_size=chunk_size,
+        overlap=overlap,
+        max_tokens=max_tokens,
+        overlap_tokens=overlap_tokens,
+        truncation_rate=report["truncation_rate"],
+        tokens_dropped_rate=report["tokens_dropped_rate"],
+        model=model_name,
+        index_type=index_type,
+        dim=index.d,
+        n_chunks=n_chunks,
+        n_vectors=index.ntotal,
+    )
+    print(f"Build finished in {time.perf_counter() - start:.1f}s; manifest at {paths['manifest']}")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build chunk store, ID mapping and FAISS index in one pass.")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--chunking", choices=("tokens", "page", "joined"), default="tokens")
+    parser.add_argument("--max-tokens", type=int, default=MAX_SEQ_TOKENS, help="Token budget per chunk (tokens)")
+    parser.add_argument("--overlap-tokens", type=int, default=32, help="Token overlap between chunks (tokens)")
+    parser.add_argument("--chunk-size", type=int, default=50, help="Sentences per chunk (page, joined)")
+    parser.add_argument("--overlap", type=int, default=5, help="Sentence overlap between chunks (page, joined)")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--cache-dir", default="cache/embeddings", help="Embedding cache directory ('' to disable)")
+    parser.add_argument("--chunk-workers", type=int, default=1, help="Processes for token chunking (--chunking tokens)")
+    parser.add_argument("--embed-workers", type=int, default=1, help="Processes for embedding (one model copy each)")
+    parser.add_argument("--csv", action="store_true", help="Also write the chunks as a CSV for inspection")
+    parser.add_argument("--version", nargs="?", const="auto", default=None,
+                        help=f"Write into {ARTIFACTS_DIR}/<version>/ (default name: UTC timestamp)")
+    parser.add_argument("--activate", action="store_true",
+                        help="Point the server at the new version (it swaps on SIGHUP or POST /admin/reload)")
+    args = parser.parse_args()
+
+    if args.activate and not args.version:
+        parser.error("--activate needs --version")
+    paths = None
+    if args.version:
+        args.version = new_version_name() if args.version == "auto" else args.version
+        paths = version_paths(ARTIFACTS_DIR, args.version)
+    build(args.data, args.chunk_size, args.overlap, args.model, args.index_type, args.cache_dir or None,
+          chunk_workers=args.chunk_workers, chunking=args.chunking, max_tokens=args.max_tokens,
+          overlap_tokens=args.overlap_tokens, embed_workers=args.embed_workers, paths=paths,
+          csv=args.csv)
+    if args.version and args.activate:
+        set_current_version(ARTIFACTS_DIR, args.version)
+        print(f"{ARTIFACTS_DIR}/CURRENT -> {args.version}")
@@ -0,0 +1,140 @@
+"""
+context_packer.py
+-----------------
+Token-budgeted packing of retrieved chunks into the LLM prompt context.
+Passages are taken in relevance order until the budget is spent; the first
+passage that does not fit is trimmed at a sentence boundary, and passages
+that nearly repeat one already packed are dropped. Keeps running counts of
+prompt sizes so they can be tracked per process.
+"""
+
+import re
+import threading
+from typing import Callable, List, Sequence, Tuple
+
+from scripts.chunking import SENTENCE_BOUNDARY
+
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """Set of lower-cased word n-grams, used to spot near-duplicate passages."""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextPacker:
+    """
+    Fits retrieved passages into a prompt token budget.
+
+    Args:
+        count_tokens (Callable): Maps a text to its token count.
+        budget (int): Most context tokens per prompt, passage headers included.
+        min_tokens (int): A trimmed passage shorter than this is left out instead.
+        dedup_threshold (float): Word-trigram Jaccard similarity at or above which a
+            passage counts as a duplicate of one already packed; 1 disables.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], budget: int = 1500, min_tokens: int = 32,
+                 dedup_threshold: float = 0.8):
+        self.count_tokens = count_tokens
+        self.budget = budget
+        self.min_tokens = min_tokens
+        self.dedup_threshold = dedup_threshold
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.context_tokens = 0
+        self.passages_in = 0
+        self.passages_packed = 0
+        self.trimmed = 0
+        self.duplicates = 0
+        self.over_budget = 0
+
+    def trim(self, text: str, max_tokens: int) -> str:
+        """Longest run of leading sentences of text within max_tokens ("" if none fits)."""
+        kept, used = [], 0
+        for sentence in SENTENCE_BOUNDARY.split(text):
+            n = self.count_tokens(sentence)
+            if used + n > max_tokens:
+                break
+            kept.append(sentence)
+            used += n
+        return " ".join(kept).strip()
+
+    def pack(self, passages: Sequence[Tuple[str, str]]) -> Tuple[List[int], List[str], dict]:
+        """
+        Selects and trims passages to fit the budget.
+
+        Args:
+            passages (Sequence[Tuple[str, str]]): (header, text) pairs in relevance
+                order; the header (e.g. a source label) is counted but never trimmed.
+
+        Returns:
+            Tuple[List[int], List[str], dict]: Indices of the packed passages, their
+            (possibly trimmed) texts, and counts for this call: context_tokens,
+            packed, trimmed, duplicates, over_budget.
+        """
+        chosen, texts, seen = [], [], []
+        used = trimmed = duplicates = over_budget = 0
+        for i, (header, text) in enumerate(passages):
+            grams = shingles(text)
+            if any(jaccard(grams, other) >= self.dedup_threshold for other in seen):
+                duplicates += 1
+                continue
+            remaining = self.budget - used - self.count_tokens(header)
+            n = self.count_tokens(text)
+            if n > remaining:
+                text = self.trim(text, remaining) if remaining >= self.min_tokens else ""
+                if not text:
+                    over_budget += 1
+                    continue
+                n = self.count_tokens(text)
+                trimmed += 1
+            chosen.append(i)
+            texts.append(text)
+            seen.append(grams)
+            used += n + self.count_tokens(header)
+        with self._lock:
+            self.passages_in += len(passages)
+            self.passages_packed += len(chosen)
+            self.trimmed += trimmed
+            self.duplicates += duplicates
+            self.over_budget += over_budget
+        return chosen, texts, {"context_tokens": used, "packed": len(chosen), "trimmed": trimmed,
+                               "duplicates": duplicates, "over_budget": over_budget}
+
+    def record_prompt(self, prompt: str, context_tokens: int = 0) -> int:
+        """Count the tokens of a prompt about to be sent and add it to the running totals."""
+        n = self.count_tokens(prompt)
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += n
+            self.max_prompt_tokens = max(self.max_prompt_tokens, n)
+            self.context_tokens += context_tokens
+        return n
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.requests or 1
+            return {
+                "budget": self.budget,
+                "requests": self.requests,
+                "mean_prompt_tokens": round(self.prompt_tokens / requests, 1),
+                "max_prompt_tokens": self.max_prompt_tokens,
+                "mean_context_tokens": round(self.context_tokens / requests, 1),
+                "passages_in": self.passages_in,
+                "passages_packed": self.passages_packed,
+                "trimmed": self.trimmed,
+                "duplicates": self.duplicates,
+                "over_budget": self.over_budget,
+            }
@@ -0,0 +1,82 @@
+"""
+embed_batcher.py
+----------------
+Micro-batching front end for the query embedding model.
+Collects concurrent queries for a few milliseconds and encodes them
+in a single SentenceTransformer forward pass.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+
+import numpy as np
+
+_STOP = object()
+
+
+class MicroBatchEmbedder:
+    """
+    Thread-safe wrapper around an embedding model that batches concurrent calls.
+
+    Args:
+        model: Object exposing ``encode(List[str], convert_to_numpy=True)``.
+        max_batch_size (int): Maximum number of queries encoded per forward pass.
+        max_wait_ms (float): How long the first query in a batch waits for others.
+    """
+
+    def __init__(self, model, max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._worker.start()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts, sharing the forward pass with any concurrent callers."""
+        futures = []
+        for text in texts:
+            fut = Future()
+            self._queue.put((text, fut))
+            futures.append(fut)
+        return np.vstack([fut.result() for fut in futures])
+
+    def close(self):
+        """Stop the background worker after it drains pending queries."""
+        self._queue.put(_STOP)
+        self._worker.join()
+
+    def _collect(self, first) -> list:
+        """Gather up to max_batch_size items, waiting at most max_wait after the first."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            texts = [text for text, _ in batch]
+            try:
+                vecs = self.model.encode(texts, convert_to_numpy=True)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for i, (_, fut) in enumerate(batch):
+                fut.set_result(vecs[i:i + 1])
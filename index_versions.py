@@ -0,0 +1,136 @@
+"""
+index_versions.py
+-----------------
+Hot swapping of the document index. One IndexVersion bundles the artifacts
+of one build (FAISS index, chunk store, ID mapping, BM25 index); requests
+take the active version once and use it throughout, so swapping in a new
+version is a single reference assignment. In-flight requests finish on the
+version they started with, whose memory is released when the last one drains.
+"""
+
+import logging
+import threading
+import time
+import weakref
+from typing import Callable, Optional
+
+log = logging.getLogger(__name__)
+
+
+class IndexVersion:
+    """
+    The artifacts of one build, served together.
+
+    Args:
+        name (str): Version directory name ("" for the unversioned layout).
+        key (str): Fingerprint that changes with the index file; keys caches.
+        index: FAISS index.
+        chunk_store: ChunkStore of the chunk texts.
+        id_mapping (np.ndarray): FAISS position -> chunk ID.
+        bm25_index: BM25Index, or None without hybrid search.
+        manifest (dict): Build manifest of the version.
+        load_seconds (dict): Load time of each artifact.
+    """
+
+    def __init__(self, name: str, key: str, index, chunk_store, id_mapping, bm25_index, manifest: dict,
+                 load_seconds: dict):
+        self.name = name
+        self.key = key
+        self.index = index
+        self.chunk_store = chunk_store
+        self.id_mapping = id_mapping
+        self.bm25_index = bm25_index
+        self.manifest = manifest
+        self.load_seconds = load_seconds
+
+    def describe(self) -> dict:
+        return {
+            "version": self.name,
+            "built_at": self.manifest.get("built_at"),
+            "n_vectors": self.index.ntotal,
+            "load_seconds": self.load_seconds,
+        }
+
+
+class VersionedIndex:
+    """
+    Holds the active IndexVersion and swaps it for a newly loaded one.
+
+    Args:
+        load (Callable[[Optional[str]], IndexVersion]): Loads, validates and warms
+            up a version by name; raises if the version must not be served.
+        key (Callable[[str], str]): Optional cheap IndexVersion.key of a version
+            on disk; when given, a version rewritten in place under the active
+            name (scripts/incremental_index.py) is reloaded too.
+    """
+
+    def __init__(self, load: Callable[[Optional[str]], IndexVersion], key: Optional[Callable[[str], str]] = None):
+        self._load = load
+        self._key = key
+        self._reload_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.active: Optional[IndexVersion] = None
+        self.swaps = 0
+        self.draining = {}  # name -> time it was swapped out, until its memory is released
+        self.last_error: Optional[str] = None
+
+    def activate(self, version: IndexVersion) -> Optional[IndexVersion]:
+        """Make version the active one; returns the version it replaced."""
+        with self._lock:
+            previous, self.active = self.active, version
+            if previous is not None:
+                self.swaps += 1
+                self.draining[previous.name] = time.time()
+                weakref.finalize(previous, self._released, previous.name)
+        return previous
+
+    def _released(self, name: str):
+        with self._lock:
+            swapped_at = self.draining.pop(name, None)
+        if swapped_at is not None:
+            log.info("Index version %r released %.1fs after the swap", name, time.time() - swapped_at)
+
+    def reload(self, name: Optional[str]) -> dict:
+        """
+        Load version name in the calling thread, then swap it in.
+
+        One reload runs at a time; requests keep being served from the active
+        version meanwhile. A version that fails to load leaves the active one
+        in place.
+
+        Returns:
+            dict: previous / active version names and load seconds; "swapped"
+            is False when name is already active and unchanged on disk.
+        """
+        with self._reload_lock:
+            active = self.active
+            if active is not None and active.name == name and not self._changed(active):
+                return {"swapped": False, "active": name}
+            start = time.perf_counter()
+            try:
+                version = self._load(name)
+            except Exception as e:
+                self.last_error = f"{name}: {type(e).__name__}: {e}"
+                raise
+            self.last_error = None
+            previous = self.activate(version)
+            seconds = round(time.perf_counter() - start, 3)
+            log.info("Swapped index version %r -> %r (loaded in %.2fs)", previous and previous.name, name, seconds)
+            return {"swapped": True, "previous": previous and previous.name, "active": name, "seconds": seconds}
+
+    def _changed(self, version: IndexVersion) -> bool:
+        if self._key is None:
+            return False
+        try:
+            return self._key(version.name) != version.key
+        except (OSError, ValueError):
+            return True  # files gone or mid-rewrite; loading reports what is wrong
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **(self.active.describe() if self.active else {}),
+                "swaps": self.swaps,
+                "draining": sorted(self.draining),
+                "last_error": self.last_error,
+            }
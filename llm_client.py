@@ -0,0 +1,186 @@
+"""
+llm_client.py
+-------------
+Pooled HTTP clients for the OpenRouter completions API.
+Both clients keep connections alive across calls so each request skips
+the TCP + TLS handshake; the async client lets one process hold many
+in-flight completions at once.
+"""
+
+import json
+from typing import AsyncIterator, Iterator, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/completions"
+NO_RESPONSE = "No response from model."
+CONNECTION_ERROR = "Error connecting to model."
+
+
+def build_payload(model: str, prompt: str, max_tokens: int = 1250, temperature: float = 0.7,
+                  stream: bool = False) -> dict:
+    payload = {"model": model, "prompt": prompt, "max_tokens": max_tokens, "temperature": temperature}
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def extract_text(data: dict) -> str:
+    """Pull the completion text out of an OpenRouter response body."""
+    choices = data.get("choices", [])
+    if choices and "text" in choices[0]:
+        return choices[0]["text"].strip()
+    return NO_RESPONSE
+
+
+def parse_sse_line(line: str, usage: Optional[dict] = None) -> Optional[str]:
+    """
+    Return the text delta carried by one SSE line from the streaming API, if any.
+    Token counts in the line (the final event carries them) are copied into usage.
+    """
+    if not line.startswith("data:"):
+        return None  # blank separators and ": OPENROUTER PROCESSING" keep-alive comments
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return None
+    try:
+        data = json.loads(data)
+    except ValueError:
+        return None
+    if usage is not None and data.get("usage"):
+        usage.update(data["usage"])
+    choices = data.get("choices", [])
+    if choices:
+        return choices[0].get("text") or None
+    return None
+
+
+def sse_event(data: dict) -> str:
+    """Format one server-sent event for the browser."""
+    return f"data: {json.dumps(data)}\n\n"
+
+
+class OpenRouterClient:
+    """
+    Blocking client backed by a keep-alive ``requests.Session``.
+
+    Args:
+        api_key (str): OpenRouter API key.
+        model (str): Model identifier sent with every request.
+        pool_size (int): Maximum pooled connections to OpenRouter.
+        connect_timeout (float): Seconds to establish a connection.
+        read_timeout (float): Seconds to wait for the completion.
+    """
+
+    def __init__(self, api_key: str, model: str, pool_size: int = 32,
+                 connect_timeout: float = 5.0, read_timeout: float = 120.0):
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+
+    def complete(self, prompt: str, usage: Optional[dict] = None, **kwargs) -> str:
+        """
+        Send prompt and return the completion text, or a fallback message on failure.
+        The token counts OpenRouter reports are copied into usage, if given.
+        """
+        try:
+            resp = self.session.post(OPENROUTER_URL, json=build_payload(self.model, prompt, **kwargs), timeout=self.timeout)
+            if resp.status_code != 200:
+                print("Error querying Mistral:", resp.status_code, resp.text[:200])
+                return CONNECTION_ERROR
+            data = resp.json()
+            if usage is not None:
+                usage.update(data.get("usage") or {})
+            return extract_text(data)
+        except Exception as e:
+            print("Error querying Mistral:", e)
+            return CONNECTION_ERROR
+
+    def stream(self, prompt: str, usage: Optional[dict] = None, **kwargs) -> Iterator[str]:
+        """Yield completion text deltas as OpenRouter produces them; token counts go into usage."""
+        payload = build_payload(self.model, prompt, stream=True, **kwargs)
+        try:
+            with self.session.post(OPENROUTER_URL, json=payload, timeout=self.timeout, stream=True) as resp:
+                # 401 / 429 / 5xx come back as a JSON error body without any data: lines
+                if resp.status_code != 200:
+                    print("Error streaming from Mistral:", resp.status_code, resp.text[:200])
+                    yield CONNECTION_ERROR
+                    return
+                for line in resp.iter_lines(decode_unicode=True):
+                    delta = parse_sse_line(line or "", usage)
+                    if delta:
+                        yield delta
+        except Exception as e:
+            print("Error streaming from Mistral:", e)
+            yield CONNECTION_ERROR
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncOpenRouterClient:
+    """
+    Asyncio client backed by a shared ``httpx.AsyncClient`` connection pool.
+    Must be created and used inside the serving event loop.
+
+    Args:
+        api_key (str): OpenRouter API key.
+        model (str): Model identifier sent with every request.
+        pool_size (int): Maximum concurrent connections to OpenRouter.
+        connect_timeout (float): Seconds to establish a connection.
+        read_timeout (float): Seconds to wait for the completion.
+    """
+
+    def __init__(self, api_key: str, model: str, pool_size: int = 100,
+                 connect_timeout: float = 5.0, read_timeout: float = 120.0):
+        self.model = model
+        self.client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+
+    async def complete(self, prompt: str, usage: Optional[dict] = None, **kwargs) -> str:
+        """
+        Send prompt and return the completion text, or a fallback message on failure.
+        The token counts OpenRouter reports are copied into usage, if given.
+        """
+        try:
+            resp = await self.client.post(OPENROUTER_URL, json=build_payload(self.model, prompt, **kwargs))
+            if resp.status_code != 200:
+                print("Error querying Mistral:", resp.status_code, resp.text[:200])
+                return CONNECTION_ERROR
+            data = resp.json()
+            if usage is not None:
+                usage.update(data.get("usage") or {})
+            return extract_text(data)
+        except Exception as e:
+            print("Error querying Mistral:", e)
+            return CONNECTION_ERROR
+
+    async def stream(self, prompt: str, usage: Optional[dict] = None, **kwargs) -> AsyncIterator[str]:
+        """Yield completion text deltas as OpenRouter produces them; token counts go into usage."""
+        payload = build_payload(self.model, prompt, stream=True, **kwargs)
+        try:
+            async with self.client.stream("POST", OPENROUTER_URL, json=payload) as resp:
+                # 401 / 429 / 5xx come back as a JSON error body without any data: lines
+                if resp.status_code != 200:
+                    body = await resp.aread()
+                    print("Error streaming from Mistral:", resp.status_code, body[:200].decode("utf-8", "replace"))
+                    yield CONNECTION_ERROR
+                    return
+                async for line in resp.aiter_lines():
+                    delta = parse_sse_line(line, usage)
+                    if delta:
+                        yield delta
+        except Exception as e:
+            print("Error streaming from Mistral:", e)
+            yield CONNECTION_ERROR
+
+    async def aclose(self):
+        await self.client.aclose()
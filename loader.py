@@ -0,0 +1,116 @@
+"""
+loader.py
+---------
+Background loading of the server's heavy components (FAISS index, chunk
+store, embedding model, ...). Each component loads in its own thread once the
+components it depends on are ready, so independent artifacts load in
+parallel while the web server already answers health checks. Per-component
+state and load time are kept for /healthz and /readyz.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, wait
+from typing import Callable, Dict, Iterable, Optional
+
+
+class ComponentLoader:
+    """
+    Runs named load functions in background threads and tracks their state.
+
+    Components are registered with add() and loaded after start(). A component
+    is "waiting" for its dependencies, then "loading", then "ready" or "failed";
+    a component whose dependency failed is "skipped". The loader is ready once
+    every component is ready.
+    """
+
+    def __init__(self):
+        self._futures: Dict[str, Future] = {}
+        self._status: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._pending = []
+        self.started = time.perf_counter()
+        self.ready_seconds: Optional[float] = None
+
+    def add(self, name: str, load: Callable[[], object], after: Iterable[str] = ()):
+        """
+        Register a component; nothing runs before start().
+
+        Args:
+            name (str): Component name reported by status().
+            load (Callable): Function doing the work; its return value is the
+                result of the component's future.
+            after (Iterable[str]): Components that must be ready first.
+        """
+        with self._lock:
+            self._futures[name] = Future()
+            self._status[name] = {"state": "waiting"}
+        self._pending.append((name, load, list(after)))
+
+    def start(self):
+        """Start one loading thread per registered component."""
+        for name, load, after in self._pending:
+            deps = [self._futures[dep] for dep in after]
+            threading.Thread(target=self._run, args=(name, load, deps, self._futures[name]),
+                             name=f"load-{name}", daemon=True).start()
+        self._pending = []
+
+    def _set(self, name: str, **status):
+        with self._lock:
+            self._status[name] = status
+
+    def _run(self, name: str, load: Callable[[], object], deps, future: Future):
+        # State is final before the future resolves, so wait() implies status() is up to date
+        failed = next((dep.exception() for dep in deps if dep.exception() is not None), None)
+        if failed is not None:
+            self._finish(name, future, error=failed, state="skipped")
+            return
+        self._set(name, state="loading")
+        start = time.perf_counter()
+        try:
+            value = load()
+        except Exception as e:
+            self._finish(name, future, error=e, state="failed", seconds=round(time.perf_counter() - start, 3))
+        else:
+            self._finish(name, future, value=value, state="ready", seconds=round(time.perf_counter() - start, 3))
+
+    def _finish(self, name: str, future: Future, value=None, error: Optional[BaseException] = None, **status):
+        if error is not None:
+            status["error"] = "a dependency failed" if status["state"] == "skipped" else f"{type(error).__name__}: {error}"
+        with self._lock:
+            self._status[name] = status
+            if self.ready_seconds is None and all(s["state"] == "ready" for s in self._status.values()):
+                self.ready_seconds = round(time.perf_counter() - self.started, 3)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    def ready(self) -> bool:
+        """True once every component has loaded."""
+        return self.ready_seconds is not None
+
+    def wait(self, timeout: Optional[float] = None):
+        """
+        Block until every component has finished loading.
+
+        Raises:
+            TimeoutError: If loading takes longer than timeout seconds.
+            Exception: The error of the first component that failed.
+        """
+        done, pending = wait(list(self._futures.values()), timeout=timeout)
+        if pending:
+            raise TimeoutError(f"{len(pending)} components still loading after {timeout}s")
+        for name, future in self._futures.items():
+            if future.exception() is not None and self._status[name]["state"] == "failed":
+                raise future.exception()
+
+    def status(self) -> dict:
+        """Readiness, time to ready and the state / load seconds of every component."""
+        with self._lock:
+            return {
+                "ready": self.ready_seconds is not None,
+                "uptime_s": round(time.perf_counter() - self.started, 3),
+                "time_to_ready_s": self.ready_seconds,
+                "components": {name: dict(status) for name, status in self._status.items()},
+            }
@@ -0,0 +1,87 @@
+"""
+memory_report.py
+----------------
+Per-process memory of a pre-forked server (serve.py): for the master and
+each worker, resident memory split into the part shared with other
+processes (copy-on-write pages of the preloaded index and model, mmapped
+artifacts) and the part unique to the process. PSS charges shared pages
+proportionally, so the PSS column sums to the node's real footprint.
+Reads /proc/<pid>/smaps_rollup (Linux).
+
+Usage:
+    python memory_report.py --pidfile serve.pid
+"""
+
+import argparse
+import os
+from typing import Dict, List
+
+
+def smaps_rollup(pid: int) -> Dict[str, int]:
+    """Memory counters of a process in kB, e.g. {"Rss": ..., "Pss": ..., "Private_Dirty": ...}."""
+    counters = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                counters[parts[0].rstrip(":")] = int(parts[1])
+    return counters
+
+
+def child_pids(pid: int) -> List[int]:
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children", "r") as f:
+            children.extend(int(child) for child in f.read().split())
+    return sorted(children)
+
+
+def memory_report(master_pid: int) -> List[dict]:
+    """
+    Memory of the master and its workers.
+
+    Returns:
+        List[dict]: One row per process with pid, role and rss / pss / shared /
+        unique sizes in MB.
+    """
+    rows = []
+    for role, pid in [("master", master_pid)] + [("worker", child) for child in child_pids(master_pid)]:
+        m = smaps_rollup(pid)
+        rows.append({
+            "pid": pid,
+            "role": role,
+            "rss_mb": m["Rss"] / 1024,
+            "pss_mb": m["Pss"] / 1024,
+            "shared_mb": (m["Shared_Clean"] + m["Shared_Dirty"]) / 1024,
+            "unique_mb": (m["Private_Clean"] + m["Private_Dirty"]) / 1024,
+        })
+    return rows
+
+
+def format_report(rows: List[dict]) -> str:
+    lines = [f"{'pid':>8} {'role':<7} {'RSS MB':>8} {'shared MB':>10} {'unique MB':>10} {'PSS MB':>8}"]
+    for r in rows:
+        lines.append(f"{r['pid']:>8} {r['role']:<7} {r['rss_mb']:>8.0f} {r['shared_mb']:>10.0f} "
+                     f"{r['unique_mb']:>10.0f} {r['pss_mb']:>8.0f}")
+    workers = [r for r in rows if r["role"] == "worker"]
+    total_rss = sum(r["rss_mb"] for r in rows)
+    total_pss = sum(r["pss_mb"] for r in rows)
+    lines.append(f"{len(workers)} workers; sum of RSS {total_rss:.0f} MB, actual footprint (sum of PSS) "
+                 f"{total_pss:.0f} MB")
+    if workers:
+        unique = sum(r["unique_mb"] for r in workers) / len(workers)
+        lines.append(f"each extra worker costs about {unique:.0f} MB (its mean unique memory)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--pid", type=int, help="Master process ID")
+    group.add_argument("--pidfile", default="serve.pid", help="Pid file written by serve.py")
+    args = parser.parse_args()
+
+    if args.pid is None:
+        with open(args.pidfile, "r") as f:
+            args.pid = int(f.read().strip())
+    print(format_report(memory_report(args.pid)))
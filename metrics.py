@@ -0,0 +1,108 @@
+"""
+metrics.py
+----------
+Prometheus metrics of the RAG chatbot, served on /metrics: per-stage latency
+histograms (query embedding, FAISS / BM25 search, re-ranking, chunk lookup,
+context packing, prompt building, LLM call), request latency and in-flight
+requests per endpoint, cache hits and misses, LLM errors and token counts.
+
+Recording a value costs a few microseconds (scripts/bench_metrics.py). Under
+serve.py each worker writes its values to PROMETHEUS_MULTIPROC_DIR and a
+scrape of any worker sums them over all workers.
+"""
+
+import os
+import time
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest)
+
+STAGES = ("embed", "faiss", "bm25", "rerank", "mmr", "chunks", "pack", "answer_cache", "prompt", "llm")
+ENDPOINTS = ("chat", "chat_stream")
+CACHES = ("retrieval", "answer")
+LLM_ERRORS = ("connection", "no_response")
+
+# 100 µs (cache lookups, packing) up to a minute (slow LLM completions)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+           10.0, 30.0, 60.0)
+
+stage_seconds = Histogram("rag_stage_seconds", "Time spent in one stage of a chat request", ["stage"],
+                          buckets=BUCKETS)
+request_seconds = Histogram("rag_request_seconds", "Chat request latency, until the last streamed byte",
+                            ["endpoint"], buckets=BUCKETS)
+llm_first_token_seconds = Histogram("rag_llm_first_token_seconds", "Time from sending a streamed prompt to its "
+                                    "first completion token", buckets=BUCKETS)
+requests_in_flight = Gauge("rag_requests_in_flight", "Chat requests being served", ["endpoint"],
+                           multiprocess_mode="livesum")
+cache_requests = Counter("rag_cache_requests_total", "Retrieval and answer cache lookups", ["cache", "result"])
+llm_errors = Counter("rag_llm_errors_total", "LLM calls that returned no answer", ["kind"])
+prompt_tokens = Counter("rag_prompt_tokens_total", "Prompt tokens sent to the LLM")
+completion_tokens = Counter("rag_completion_tokens_total", "Completion tokens received from the LLM")
+
+# Label lookups take a lock; bind every child once so the request path does not
+_stages = {stage: stage_seconds.labels(stage) for stage in STAGES}
+_requests = {endpoint: (request_seconds.labels(endpoint), requests_in_flight.labels(endpoint))
+             for endpoint in ENDPOINTS}
+_caches = {(cache, hit): cache_requests.labels(cache, "hit" if hit else "miss") for cache in CACHES
+           for hit in (True, False)}
+_llm_errors = {kind: llm_errors.labels(kind) for kind in LLM_ERRORS}
+
+
+def stage(name: str):
+    """Context manager timing one stage (one of STAGES) into rag_stage_seconds."""
+    return _stages[name].time()
+
+
+def first_token(seconds: float):
+    llm_first_token_seconds.observe(seconds)
+
+
+class _Request:
+    __slots__ = ("histogram", "in_flight", "start")
+
+    def __init__(self, endpoint: str):
+        self.histogram, self.in_flight = _requests[endpoint]
+
+    def __enter__(self):
+        self.in_flight.inc()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        self.in_flight.dec()
+
+
+def request(endpoint: str) -> _Request:
+    """Context manager counting a request in flight and timing it (endpoint is one of ENDPOINTS)."""
+    return _Request(endpoint)
+
+
+def cache_result(cache: str, hit: bool):
+    _caches[cache, hit].inc()
+
+
+def llm_error(kind: str):
+    _llm_errors[kind].inc()
+
+
+def tokens(prompt: int, completion: int = 0):
+    prompt_tokens.inc(prompt)
+    if completion:
+        completion_tokens.inc(completion)
+
+
+def render():
+    """
+    Current metrics in the Prometheus text format.
+
+    Returns:
+        tuple: (body bytes, content type).
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,95 @@
+"""
+onnx_embedder.py
+----------------
+Query embedder that runs an exported SentenceTransformer under ONNX Runtime.
+Needs only onnxruntime, tokenizers and NumPy, so a serving process never
+imports torch. Models are produced by scripts/export_onnx.py, which bakes
+pooling and normalization into the graph and can quantize it to int8.
+"""
+
+import json
+import os
+from typing import List
+
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+
+
+def default_model_file(model_dir: str) -> str:
+    """The int8 graph if export_onnx.py --quantize wrote one, else the fp32 model.onnx."""
+    return "model_int8.onnx" if os.path.exists(os.path.join(model_dir, "model_int8.onnx")) else "model.onnx"
+
+
+class OnnxEmbedder:
+    """
+    Drop-in replacement for SentenceTransformer.encode on an exported model.
+
+    Args:
+        model_dir (str): Directory written by export_onnx.py.
+        model_file (str): Graph to load, e.g. "model.onnx" or "model_int8.onnx".
+        threads (int): ONNX Runtime intra-op threads per session.
+        batch_size (int): Texts per forward pass in encode.
+    """
+
+    def __init__(self, model_dir: str, model_file: str = "model.onnx", threads: int = 1, batch_size: int = 32):
+        for name in ("embedder.json", "tokenizer.json", model_file):
+            if not os.path.exists(os.path.join(model_dir, name)):
+                raise FileNotFoundError(f"No {name} in {model_dir}; export the model first, from scripts/: "
+                                        f"python export_onnx.py --out {model_dir} --quantize")
+        with open(os.path.join(model_dir, "embedder.json"), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.model_name = self.config["model"]
+        self.max_length = self.config["max_length"]
+        self.batch_size = batch_size
+
+        tokenizer_path = os.path.join(model_dir, "tokenizer.json")
+        self._counter = Tokenizer.from_file(tokenizer_path)
+        self._counter.no_truncation()
+        self._counter.no_padding()
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(self.max_length)
+        self.tokenizer.enable_padding(pad_id=self.config["pad_id"], pad_token=self.config["pad_token"])
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(os.path.join(model_dir, model_file), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dim"]
+
+    def count_tokens(self, text: str) -> int:
+        """Word pieces in text, special tokens excluded and without truncation."""
+        return len(self._counter.encode(text, add_special_tokens=False).ids)
+
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        return self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+
+    def encode(self, texts: List[str], convert_to_numpy: bool = True, **_) -> np.ndarray:
+        """
+        Embed texts.
+
+        Args:
+            texts (List[str]): Texts to embed.
+            convert_to_numpy (bool): Accepted for SentenceTransformer compatibility;
+                the result is always a NumPy array.
+
+        Returns:
+            np.ndarray: float32 embeddings, shape (len(texts), dim).
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        parts = [self._forward(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        if not parts:
+            return np.empty((0, self.config["dim"]), dtype=np.float32)
+        return np.vstack(parts).astype(np.float32)
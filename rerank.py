@@ -0,0 +1,163 @@
+"""
+rerank.py
+---------
+Re-ranking of over-fetched FAISS candidates before they reach the prompt.
+Maximal Marginal Relevance picks the final k chunks so that each one is
+relevant to the query but dissimilar to those already picked, which keeps
+near-identical overlapping chunks from filling the context. An optional
+cross-encoder scores (query, chunk) pairs in one batched forward pass under
+a per-request time budget. The budget bounds how long a request waits, not
+the CPU a forward pass uses: a pass that overruns keeps its thread until it
+finishes, so requests skip the cross-encoder while every thread is busy.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import List, Optional
+
+import faiss
+import numpy as np
+
+
+def enable_reconstruct(index):
+    """IVF indexes can only reconstruct stored vectors once they keep a direct map."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index
+
+
+def candidate_vectors(index, labels: np.ndarray) -> np.ndarray:
+    """Stored (normalized) vectors of search results; approximate for PQ indexes."""
+    return index.reconstruct_batch(np.ascontiguousarray(labels, dtype=np.int64))
+
+
+def mmr(query_vec: np.ndarray, doc_vecs: np.ndarray, k: int, lambda_: float = 0.5,
+        relevance: np.ndarray = None) -> np.ndarray:
+    """
+    Maximal Marginal Relevance selection over normalized vectors.
+
+    Args:
+        query_vec (np.ndarray): Query embedding, shape (d,) or (1, d).
+        doc_vecs (np.ndarray): Candidate embeddings, shape (n, d).
+        k (int): Number of candidates to select.
+        lambda_ (float): Trade-off between relevance (1.0) and diversity (0.0).
+        relevance (np.ndarray): Optional per-candidate relevance (e.g. fused hybrid
+            scores) used instead of query cosine; scaled so the best is 1.
+
+    Returns:
+        np.ndarray: Indices into doc_vecs of the selected candidates, in pick order.
+    """
+    n = len(doc_vecs)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if relevance is None:
+        relevance = doc_vecs @ np.asarray(query_vec, dtype=np.float32).ravel()
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32) / max(float(np.max(relevance)), 1e-9)
+    similarity = doc_vecs @ doc_vecs.T
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of every candidate to anything already selected
+    redundancy = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    for _ in range(k - 1):
+        scores = lambda_ * relevance - (1.0 - lambda_) * redundancy
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        np.maximum(redundancy, similarity[pick], out=redundancy)
+    return np.asarray(selected, dtype=np.int64)
+
+
+class CrossEncoderReranker:
+    """
+    Cross-encoder relevance scoring with a latency budget.
+
+    Args:
+        model_name (str): SentenceTransformers CrossEncoder, e.g.
+            "cross-encoder/ms-marco-MiniLM-L-6-v2".
+        budget_ms (float): Most time a request waits for scores; past it the
+            caller gets None and should keep its own order. A timed-out
+            forward pass still runs to completion in its thread.
+        max_workers (int): Forward passes that may run at once; a request
+            arriving while all of them run gets None without queueing.
+        max_length (int): Token limit of each (query, chunk) pair.
+    """
+
+    def __init__(self, model_name: str, budget_ms: float = 150.0, max_workers: int = 2, max_length: int = 512):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, max_length=max_length)
+        self.budget = budget_ms / 1000.0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rerank")
+        self._max_in_flight = max_workers
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.fallbacks = 0
+        self.skipped = 0
+        self.total_ms = 0.0
+        # First call pays for lazy initialisation; keep it out of request latency
+        self.model.predict([("warm up", "warm up")], show_progress_bar=False)
+
+    def _predict(self, query: str, texts: List[str]) -> np.ndarray:
+        pairs = [(query, text) for text in texts]
+        return self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False, convert_to_numpy=True)
+
+    def _finished(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def scores(self, query: str, texts: List[str]) -> Optional[np.ndarray]:
+        """
+        Relevance probability of every text for query, or None if the budget ran
+        out or every thread is still busy with earlier (possibly timed-out) passes.
+
+        Args:
+            query (str): User question.
+            texts (List[str]): Candidate chunk texts.
+
+        Returns:
+            Optional[np.ndarray]: Sigmoid of the cross-encoder logits, shape (len(texts),).
+        """
+        start = time.perf_counter()
+        with self._lock:
+            saturated = self._in_flight >= self._max_in_flight
+            if saturated:
+                self.requests += 1
+                self.fallbacks += 1
+                self.skipped += 1
+            else:
+                self._in_flight += 1
+        if saturated:
+            # Queueing behind passes that already overran would only time out too
+            return None
+        future = self._pool.submit(self._predict, query, texts)
+        future.add_done_callback(self._finished)
+        try:
+            logits = np.asarray(future.result(timeout=self.budget), dtype=np.float32).ravel()
+        except TimeoutError:
+            future.cancel()
+            logits = None
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.requests += 1
+            self.total_ms += elapsed_ms
+            self.fallbacks += logits is None
+        return None if logits is None else 1.0 / (1.0 + np.exp(-logits))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "budget_ms": self.budget * 1000,
+                "requests": self.requests,
+                "fallbacks": self.fallbacks,
+                "skipped": self.skipped,
+                "mean_ms": round(self.total_ms / (self.requests or 1), 2),
+            }
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
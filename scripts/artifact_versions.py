@@ -0,0 +1,65 @@
+"""
+artifact_versions.py
+--------------------
+Versioned artifact directories shared by the build pipeline and the server.
+Each build can write its FAISS index, chunk store, ID mapping, BM25 index and
+manifest into artifacts/<version>/; the CURRENT file next to them names the
+version the server should load, and is replaced atomically to switch.
+"""
+
+import os
+import time
+from typing import Dict, List, Optional
+
+ARTIFACTS_DIR = "artifacts"
+CURRENT_FILE = "CURRENT"
+
+
+def version_paths(root: str, version: str) -> Dict[str, str]:
+    """
+    Artifact paths inside one version directory.
+
+    Returns:
+        Dict[str, str]: index, csv (only written with --csv), id_mapping, chunks (chunk store / BM25 prefix)
+        and manifest paths.
+    """
+    directory = os.path.join(root, version)
+    return {
+        "index": os.path.join(directory, "capillary_chunks_index.faiss"),
+        "csv": os.path.join(directory, "capillary_chunks_df.csv"),
+        "id_mapping": os.path.join(directory, "capillary_chunks_id_mapping.npy"),
+        "chunks": os.path.join(directory, "capillary_chunks"),
+        "manifest": os.path.join(directory, "build_manifest.json"),
+    }
+
+
+def new_version_name() -> str:
+    """Sortable UTC timestamp name for a new build, e.g. "20250101-120000"."""
+    return time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+
+
+def list_versions(root: str) -> List[str]:
+    """Complete versions (their manifest exists) under root, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root)
+                  if os.path.exists(version_paths(root, name)["manifest"]))
+
+
+def current_version(root: str) -> Optional[str]:
+    """Version named by root/CURRENT, or None if there is no pointer."""
+    path = os.path.join(root, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def set_current_version(root: str, version: str):
+    """Atomically point root/CURRENT at a complete version."""
+    if version not in list_versions(root):
+        raise ValueError(f"No complete build named {version!r} in {root}")
+    path = os.path.join(root, CURRENT_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(path + ".tmp", path)
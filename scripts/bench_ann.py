@@ -0,0 +1,80 @@
+"""
+bench_ann.py
+------------
+Benchmark FAISS index types against the exact Flat baseline.
+Reports recall@k, queries/sec and serialized index size for each type,
+using the vectors already stored in the built Flat index (no re-embedding).
+
+Usage:
+    python bench_ann.py --replicate 100 --k 5
+"""
+
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from embedding_index import INDEX_TYPES, make_index
+
+
+def load_vectors(index_path: str) -> np.ndarray:
+    """Reconstruct all stored vectors from a flat index file."""
+    index = faiss.read_index(index_path)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def replicate(vectors: np.ndarray, factor: int, noise: float = 0.05, seed: int = 0) -> np.ndarray:
+    """Grow the corpus by adding jittered, re-normalized copies of every vector."""
+    if factor <= 1:
+        return vectors
+    rng = np.random.default_rng(seed)
+    copies = [vectors]
+    for _ in range(factor - 1):
+        jittered = vectors + rng.normal(scale=noise, size=vectors.shape).astype(np.float32)
+        copies.append(jittered / np.linalg.norm(jittered, axis=1, keepdims=True))
+    return np.vstack(copies).astype(np.float32)
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
+def bench(index, queries: np.ndarray, k: int, repeats: int = 3):
+    """Return (results, queries per second) for one query per call, as the app searches."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = [index.search(queries[i:i + 1], k)[1][0] for i in range(len(queries))]
+        best = min(best, time.perf_counter() - start)
+    return np.array(rows), len(queries) / best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-path", default="../faiss_index/capillary_chunks_index.faiss")
+    parser.add_argument("--replicate", type=int, default=1, help="Corpus size multiplier")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    args = parser.parse_args()
+
+    vectors = replicate(load_vectors(args.index_path), args.replicate)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    queries = queries + rng.normal(scale=0.05, size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={args.k}\n")
+
+    truth = None
+    print(f"{'type':<10} {'build s':>8} {'recall@k':>9} {'QPS':>10} {'size MB':>9}")
+    for index_type in ["flat"] + [t for t in args.types if t != "flat"]:
+        start = time.perf_counter()
+        index = make_index(vectors, index_type)
+        build_s = time.perf_counter() - start
+        found, qps = bench(index, queries, args.k)
+        if truth is None:
+            truth = found
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+        print(f"{index_type:<10} {build_s:>8.2f} {recall_at_k(truth, found):>9.3f} {qps:>10.0f} {size_mb:>9.1f}")
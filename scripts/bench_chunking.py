@@ -0,0 +1,59 @@
+"""
+bench_chunking.py
+-----------------
+Throughput of the build's chunking (token_chunking.iter_build_chunks, what
+build_rag_pipeline.py --chunk-workers runs) at several worker counts, on the
+scraped corpus replicated N times. Workers chunk and tokenize whole batches
+of pages for "tokens"; "page" and "joined" always run in one process and are
+listed as a reference. Pages are streamed, so the replicated corpus is never
+held in memory. Also checks every worker count produces the same chunks.
+
+Usage:
+    python bench_chunking.py --replicate 10 --chunking tokens page joined --workers 1 2 4 8
+"""
+
+import argparse
+import hashlib
+import time
+
+from ingest import iter_pages
+from token_chunking import iter_build_chunks
+
+
+def replicated_pages(pages, factor: int):
+    for _ in range(factor):
+        yield from pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="../data/capillary_docs.json")
+    parser.add_argument("--replicate", type=int, default=10)
+    parser.add_argument("--chunking", nargs="+", choices=("tokens", "page", "joined"),
+                        default=["tokens", "page", "joined"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    args = parser.parse_args()
+
+    pages = list(iter_pages(args.data))
+    n_pages = len(pages) * args.replicate
+    n_mb = sum(len(page["text"].encode("utf-8")) for page in pages) * args.replicate / 1e6
+    print(f"{n_pages} pages, {n_mb:.0f} MB of text\n")
+
+    print(f"{'chunking':>8} {'workers':>7} {'seconds':>8} {'chunks':>8} {'chunks/s':>9} {'MB/s':>7} {'speedup':>8}")
+    for chunking in args.chunking:
+        baseline, reference = None, None
+        for workers in (args.workers if chunking == "tokens" else [1]):
+            digest = hashlib.sha1()
+            n_chunks = 0
+            start = time.perf_counter()
+            for chunk in iter_build_chunks(replicated_pages(pages, args.replicate), chunking, model=args.model,
+                                           workers=workers):
+                digest.update((chunk if isinstance(chunk, str) else chunk["text"]).encode("utf-8"))
+                n_chunks += 1
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            reference = reference or digest.hexdigest()
+            assert digest.hexdigest() == reference, f"{chunking}: {workers} workers produced different chunks"
+            print(f"{chunking:>8} {workers:>7} {elapsed:>8.2f} {n_chunks:>8} {n_chunks / elapsed:>9.0f} "
+                  f"{n_mb / elapsed:>7.1f} {baseline / elapsed:>7.2f}x")
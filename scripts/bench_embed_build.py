@@ -0,0 +1,58 @@
+"""
+bench_embed_build.py
+--------------------
+Build-time embedding throughput (chunks/sec) of the single-process
+SentenceTransformer.encode baseline versus ParallelEncoder at several worker
+counts, with and without token-length bucketing. Uses a sample of the chunk
+store so runs stay short; multiply out to size a build machine.
+
+Usage:
+    python bench_embed_build.py --chunks 2000 --workers 1 2 4 8
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from chunk_store import ChunkStore
+from embedding_index import ParallelEncoder
+
+
+def timed(encode, texts):
+    start = time.perf_counter()
+    vectors = encode(texts)
+    return vectors, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default="../metadata/capillary_chunks")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    store = ChunkStore(args.store)
+    rng = np.random.default_rng(0)
+    texts = store.get_many(rng.choice(len(store), size=args.chunks, replace=args.chunks > len(store)))
+    print(f"{len(texts)} chunks, batch size {args.batch_size}\n")
+    print(f"{'encoder':<28} {'seconds':>8} {'chunks/s':>9} {'speedup':>8} {'max |diff|':>11}")
+
+    model = SentenceTransformer(args.model, device="cpu")
+    model.encode(texts[:8])  # warm-up
+    reference, baseline = timed(lambda t: model.encode(t, batch_size=args.batch_size, convert_to_numpy=True), texts)
+    print(f"{'SentenceTransformer.encode':<28} {baseline:>8.1f} {len(texts) / baseline:>9.0f} {1:>7.2f}x {0:>11.1e}")
+    del model
+
+    for workers in args.workers:
+        for bucket in (False, True):
+            encoder = ParallelEncoder(args.model, workers, batch_size=args.batch_size, bucket=bucket)
+            encoder.encode(texts[:workers * 2])  # load the model in every worker before timing
+            vectors, seconds = timed(encoder.encode, texts)
+            encoder.close()
+            name = f"{workers} worker{'s' if workers > 1 else ''}, {'bucketed' if bucket else 'input order'}"
+            print(f"{name:<28} {seconds:>8.1f} {len(texts) / seconds:>9.0f} {baseline / seconds:>7.2f}x "
+                  f"{np.abs(vectors - reference).max():>11.1e}")
@@ -0,0 +1,87 @@
+"""
+bench_embedder.py
+-----------------
+Query-embedding latency and memory of the torch SentenceTransformer versus
+the ONNX Runtime fp32 and int8 graphs. Each backend runs in a fresh process,
+so the reported RSS is what a serving worker pays for importing and loading
+it. Latency is per single query (as /chat embeds), plus batch-32 throughput.
+
+Usage:
+    python bench_embedder.py --onnx-dir ../models/all-MiniLM-L6-v2 --threads 1 2 4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def rss_mb() -> float:
+    """Resident set size of this process, from /proc (Linux)."""
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def run_backend(backend: str, onnx_dir: str, threads: int, queries: int) -> dict:
+    """Measured inside the child process; returns load time, RSS and latencies."""
+    import numpy as np
+
+    start = time.perf_counter()
+    if backend == "torch":
+        import torch
+        torch.set_num_threads(threads)
+        from sentence_transformers import SentenceTransformer
+        with open(os.path.join(onnx_dir, "embedder.json"), "r", encoding="utf-8") as f:
+            model = SentenceTransformer(json.load(f)["model"], device="cpu")
+    else:
+        sys.path.insert(0, ROOT)
+        from onnx_embedder import OnnxEmbedder
+        model = OnnxEmbedder(onnx_dir, backend, threads=threads)
+    load_s = time.perf_counter() - start
+
+    texts = [f"How do I configure loyalty program rule number {i} for tier upgrades?" for i in range(queries)]
+    model.encode(texts[:4], convert_to_numpy=True)  # warm-up
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        model.encode([text], convert_to_numpy=True)
+        latencies.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    for i in range(0, len(texts), 32):
+        model.encode(texts[i:i + 32], convert_to_numpy=True)
+    batch_qps = len(texts) / (time.perf_counter() - start)
+    p50, p95 = np.percentile(latencies, [50, 95])
+    return {"load_s": load_s, "rss_mb": rss_mb(), "p50_ms": p50, "p95_ms": p95, "batch_qps": batch_qps}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--onnx-dir", default="../models/all-MiniLM-L6-v2")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", default=["torch", "model.onnx", "model_int8.onnx"])
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_backend(args.child, args.onnx_dir, args.threads[0], args.queries)))
+        sys.exit(0)
+
+    print(f"{'backend':<16} {'threads':>7} {'load s':>7} {'RSS MB':>7} {'p50 ms':>7} {'p95 ms':>7} {'batch q/s':>10}")
+    for backend in args.backends:
+        if backend != "torch" and not os.path.exists(os.path.join(args.onnx_dir, backend)):
+            continue
+        for threads in args.threads:
+            out = subprocess.run([sys.executable, __file__, "--child", backend, "--onnx-dir", args.onnx_dir,
+                                  "--threads", str(threads), "--queries", str(args.queries)],
+                                 capture_output=True, text=True, check=True)
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{backend:<16} {threads:>7} {r['load_s']:>7.2f} {r['rss_mb']:>7.0f} {r['p50_ms']:>7.2f} "
+                  f"{r['p95_ms']:>7.2f} {r['batch_qps']:>10.0f}")
@@ -0,0 +1,97 @@
+"""
+bench_hybrid.py
+---------------
+Latency that hybrid retrieval adds on top of dense search, per query, as
+app.search_index runs it: FAISS search alone versus FAISS + BM25 search +
+reciprocal rank fusion (MMR runs in both). The chunk store is replicated N
+times to show how the BM25 stage scales; query texts are word windows taken
+from random chunks, query vectors jittered copies of those chunks' vectors.
+
+Usage:
+    python bench_hybrid.py --replicate 1 10 100 --k 5
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from bench_ann import load_vectors, replicate
+from bm25_index import BM25Index, reciprocal_rank_fusion, write_bm25_index
+from chunk_store import ChunkStore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from rerank import candidate_vectors, mmr  # noqa: E402
+
+
+def sample_queries(store: ChunkStore, n: int, words: int = 8, seed: int = 1):
+    """(chunk ID, query text) pairs: a random run of words from a random chunk."""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for chunk_id in rng.choice(len(store), size=n):
+        tokens = store[int(chunk_id)].split()
+        start = int(rng.integers(0, max(1, len(tokens) - words)))
+        queries.append((int(chunk_id), " ".join(tokens[start:start + words])))
+    return queries
+
+
+def percentiles(samples_ms):
+    return np.percentile(samples_ms, [50, 95, 99])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-path", default="../faiss_index/capillary_chunks_index.faiss")
+    parser.add_argument("--store", default="../metadata/capillary_chunks")
+    parser.add_argument("--replicate", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--fetch-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    store = ChunkStore(args.store)
+    base_vectors = load_vectors(args.index_path)
+    queries = sample_queries(store, args.queries)
+    n_candidates = args.k * args.fetch_factor
+
+    print(f"{'chunks':>8} {'postings':>9} {'dense p50':>10} {'hybrid p50':>11} {'added p50':>10} "
+          f"{'added p95':>10} {'added p99':>10}  (ms)")
+    for factor in args.replicate:
+        vectors = replicate(base_vectors, factor)
+        index = faiss.IndexFlatIP(vectors.shape[1])
+        index.add(vectors)
+        with tempfile.TemporaryDirectory() as tmp:
+            prefix = os.path.join(tmp, "bench")
+            write_bm25_index((text for _ in range(factor) for text in store), prefix)
+            bm25 = BM25Index(prefix)
+            rng = np.random.default_rng(2)
+            dense_ms, hybrid_ms = [], []
+            for chunk_id, text in queries:
+                query_vec = vectors[chunk_id:chunk_id + 1] + rng.normal(scale=0.05, size=(1, vectors.shape[1]))
+                query_vec = (query_vec / np.linalg.norm(query_vec)).astype(np.float32)
+
+                start = time.perf_counter()
+                _, I = index.search(query_vec, n_candidates)
+                labels = I[0][I[0] >= 0]
+                mmr(query_vec, candidate_vectors(index, labels), args.k)
+                dense_ms.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                _, I = index.search(query_vec, n_candidates)
+                labels = I[0][I[0] >= 0]
+                lexical, _ = bm25.search(text, n_candidates)
+                fused, relevance = reciprocal_rank_fusion([labels, lexical])
+                fused, relevance = fused[:n_candidates], relevance[:n_candidates]
+                mmr(query_vec, candidate_vectors(index, fused), args.k, relevance=relevance)
+                hybrid_ms.append((time.perf_counter() - start) * 1000)
+            n_postings = len(bm25.docs)
+            del bm25
+
+        added = np.array(hybrid_ms) - np.array(dense_ms)
+        p50, p95, p99 = percentiles(added)
+        print(f"{len(vectors):>8} {n_postings:>9} {np.median(dense_ms):>10.2f} {np.median(hybrid_ms):>11.2f} "
+              f"{p50:>10.2f} {p95:>10.2f} {p99:>10.2f}")
@@ -0,0 +1,108 @@
+"""
+bench_metrics.py
+----------------
+Overhead of the Prometheus instrumentation in metrics.py: the cost of each
+recording primitive, and of all the recording one /chat request does (request
+timer, retrieval and answer cache counters, nine stage timers, token
+counters), with 1 or more threads recording at once as in a gthread worker.
+Runs once with in-process metrics (python app.py, uvicorn) and once in the
+multiprocess mode serve.py uses, each in a fresh process. Also times one
+/metrics scrape.
+
+Usage:
+    python bench_metrics.py --threads 1 8 --iterations 100000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+REQUEST_STAGES = ("embed", "faiss", "bm25", "mmr", "chunks", "pack", "answer_cache", "prompt", "llm")
+
+
+def per_call_us(fn, iterations: int) -> float:
+    """Mean microseconds per fn() call, minus the cost of the loop itself."""
+    def empty():
+        pass
+    timings = []
+    for f in (empty, fn):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            f()
+        timings.append(time.perf_counter() - start)
+    return (timings[1] - timings[0]) / iterations * 1e6
+
+
+def run_mode(threads, iterations: int) -> dict:
+    """Measured inside the child process."""
+    sys.path.insert(0, ROOT)
+    import metrics
+
+    def stage():
+        with metrics.stage("faiss"):
+            pass
+
+    def one_request():
+        with metrics.request("chat"):
+            metrics.cache_result("retrieval", False)
+            for name in REQUEST_STAGES:
+                with metrics.stage(name):
+                    pass
+            metrics.cache_result("answer", False)
+            metrics.tokens(1600, 400)
+
+    result = {
+        "stage_us": per_call_us(stage, iterations),
+        "counter_us": per_call_us(lambda: metrics.cache_result("retrieval", True), iterations),
+        "request_us": {},
+    }
+    for n in threads:
+        # Every thread records its share of the requests; wall time over all of them
+        per_thread = max(1, iterations // 10 // n)
+        workers = [threading.Thread(target=lambda: [one_request() for _ in range(per_thread)]) for _ in range(n)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        result["request_us"][n] = (time.perf_counter() - start) / (per_thread * n) * 1e6
+    start = time.perf_counter()
+    body, _ = metrics.render()
+    result["scrape_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_mode(args.threads, args.iterations)))
+        sys.exit(0)
+
+    header = f"{'mode':<13} {'stage us':>9} {'counter us':>11}"
+    header += "".join(f" {f'request us ({n}t)':>17}" for n in args.threads) + f" {'scrape ms':>10}"
+    print(header)
+    for mode in ("in-process", "multiprocess"):
+        env = dict(os.environ)
+        env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+        with tempfile.TemporaryDirectory(prefix="rag-metrics-") as metrics_dir:
+            if mode == "multiprocess":
+                env["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+            out = subprocess.run([sys.executable, __file__, "--child", "--iterations", str(args.iterations),
+                                  "--threads", *map(str, args.threads)],
+                                 capture_output=True, text=True, check=True, env=env)
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        row = f"{mode:<13} {r['stage_us']:>9.2f} {r['counter_us']:>11.2f}"
+        row += "".join(f" {r['request_us'][str(n)]:>17.1f}" for n in args.threads) + f" {r['scrape_ms']:>10.2f}"
+        print(row)
@@ -0,0 +1,194 @@
+"""
+bm25_index.py
+-------------
+Compact lexical (BM25) index over the chunk store, built next to the FAISS
+index and memory-mapped by the server. Terms are stored as sorted 64-bit
+hashes; each term's posting list (chunk IDs plus precomputed BM25 weights)
+is a slice of two flat NumPy arrays, so a query is a few binary searches
+and one weighted bincount. Identifiers such as ``loyaltyProgramId`` are
+indexed whole as well as split into their camelCase / snake_case parts.
+"""
+
+import hashlib
+import json
+import os
+import re
+from array import array
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"[A-Za-z0-9_]+")
+_SUBWORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in into is it its my of on or so that the "
+    "then there these this to was what when where which who why will with you your".split()
+)
+
+
+def lexical_terms(text: str) -> List[str]:
+    """Lower-cased word tokens of text, plus the parts of compound identifiers."""
+    terms = []
+    for token in _TOKEN.findall(text):
+        lower = token.lower()
+        if lower in STOPWORDS:
+            continue
+        terms.append(lower)
+        parts = [part.lower() for part in _SUBWORD.findall(token)]
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part not in STOPWORDS)
+    return terms
+
+
+def term_hashes(terms: Iterable[str]) -> np.ndarray:
+    """64-bit hashes identifying terms (stable across processes, unlike hash())."""
+    return np.array([int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+                     for term in terms], dtype=np.uint64)
+
+
+def bm25_paths(prefix: str) -> dict:
+    return {
+        "terms": f"{prefix}.bm25_terms.npy",
+        "offsets": f"{prefix}.bm25_offsets.npy",
+        "docs": f"{prefix}.bm25_docs.npy",
+        "weights": f"{prefix}.bm25_weights.npy",
+        "meta": f"{prefix}.bm25.json",
+    }
+
+
+def write_bm25_index(texts: Iterable[str], prefix: str, doc_ids: Optional[Iterable[int]] = None,
+                     k1: float = 1.2, b: float = 0.75) -> int:
+    """
+    Build and save a BM25 index.
+
+    Args:
+        texts (Iterable[str]): Chunk texts, streamed once.
+        prefix (str): Path prefix of the index files (the chunk store prefix).
+        doc_ids (Iterable[int]): Chunk ID of each text; defaults to 0, 1, 2, ...
+            IDs must match the labels the FAISS index returns.
+        k1 (float): BM25 term-frequency saturation.
+        b (float): BM25 document-length normalization.
+
+    Returns:
+        int: Number of documents indexed.
+    """
+    doc_ids = iter(doc_ids) if doc_ids is not None else None
+    # One row per (term, chunk) posting, accumulated in compact typed arrays
+    hashes, docs, tfs, lengths = array("Q"), array("q"), array("f"), array("f")
+    n_docs, total_length = 0, 0
+    for text in texts:
+        doc_id = next(doc_ids) if doc_ids is not None else n_docs
+        counts = Counter(lexical_terms(text))
+        length = sum(counts.values())
+        hashes.extend(term_hashes(counts).tolist())
+        docs.extend([doc_id] * len(counts))
+        tfs.extend(counts.values())
+        lengths.extend([length] * len(counts))
+        n_docs += 1
+        total_length += length
+
+    hashes = np.frombuffer(hashes, dtype=np.uint64)
+    order = np.lexsort((np.frombuffer(docs, dtype=np.int64), hashes))
+    terms, starts, df = np.unique(hashes[order], return_index=True, return_counts=True)
+    avgdl = total_length / n_docs if n_docs else 1.0
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+    tf = np.frombuffer(tfs, dtype=np.float32)[order]
+    norm = k1 * (1 - b + b * np.frombuffer(lengths, dtype=np.float32)[order] / max(avgdl, 1e-9))
+    weights = np.repeat(idf, df) * tf * (k1 + 1) / (tf + norm)
+
+    paths = bm25_paths(prefix)
+    arrays = {
+        "terms": terms,
+        "offsets": np.append(starts, len(order)).astype(np.int64),
+        "docs": np.frombuffer(docs, dtype=np.int64)[order].astype(np.int32 if n_docs < 2 ** 31 else np.int64),
+        "weights": weights.astype(np.float32),
+    }
+    for name, values in arrays.items():
+        with open(paths[name] + ".tmp", "wb") as f:
+            np.save(f, values)
+    with open(paths["meta"] + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"n_docs": n_docs, "n_terms": len(terms), "avgdl": avgdl, "k1": k1, "b": b}, f)
+    for path in paths.values():
+        os.replace(path + ".tmp", path)
+    return n_docs
+
+
+class BM25Index:
+    """
+    Read-only, memory-mapped view of an index written by write_bm25_index.
+
+    Args:
+        prefix (str): Path prefix the index was written with.
+    """
+
+    def __init__(self, prefix: str):
+        paths = bm25_paths(prefix)
+        self.terms = np.load(paths["terms"], mmap_mode="r")
+        self.offsets = np.load(paths["offsets"], mmap_mode="r")
+        self.docs = np.load(paths["docs"], mmap_mode="r")
+        self.weights = np.load(paths["weights"], mmap_mode="r")
+        with open(paths["meta"], "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+    @staticmethod
+    def exists(prefix: str) -> bool:
+        return os.path.exists(bm25_paths(prefix)["meta"])
+
+    def __len__(self) -> int:
+        return self.meta["n_docs"]
+
+    def search(self, query: str, top_k: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k chunks by BM25 score for a free-text query.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Chunk IDs and their scores, best first;
+            empty if no query term occurs in the index.
+        """
+        hashes = np.unique(term_hashes(set(lexical_terms(query))))
+        slots = np.searchsorted(self.terms, hashes)
+        found = slots < len(self.terms)
+        found[found] = self.terms[slots[found]] == hashes[found]
+        slots = slots[found]
+        if not len(slots):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        docs = np.concatenate([self.docs[self.offsets[s]:self.offsets[s + 1]] for s in slots])
+        weights = np.concatenate([self.weights[self.offsets[s]:self.offsets[s + 1]] for s in slots])
+        unique_docs, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights).astype(np.float32)
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return unique_docs[best].astype(np.int64), scores[best]
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse ranked ID lists: score(id) = sum over lists of 1 / (k + rank).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: IDs and fused scores, best first.
+    """
+    ids = np.concatenate([np.asarray(ranking, dtype=np.int64) for ranking in rankings])
+    if not len(ids):
+        return ids, np.empty(0, dtype=np.float64)
+    ranks = np.concatenate([np.arange(1, len(ranking) + 1) for ranking in rankings])
+    unique_ids, inverse = np.unique(ids, return_inverse=True)
+    scores = np.bincount(inverse, weights=1.0 / (k + ranks))
+    # Ties keep the order of first appearance (dense results come first)
+    first = np.full(len(unique_ids), len(ids))
+    np.minimum.at(first, inverse, np.arange(len(ids)))
+    order = np.lexsort((first, -scores))
+    return unique_ids[order], scores[order]
+
+
+if __name__ == "__main__":
+    from chunk_store import ChunkStore
+
+    STORE_PREFIX = "../metadata/capillary_chunks"
+    n_docs = write_bm25_index(ChunkStore(STORE_PREFIX), STORE_PREFIX)
+    print(f"BM25 index over {n_docs} chunks, {BM25Index(STORE_PREFIX).meta['n_terms']} terms.")
@@ -0,0 +1,82 @@
+"""
+check_onnx_parity.py
+--------------------
+Parity check of exported ONNX embedders against the torch SentenceTransformer.
+Embeds sample queries and chunk texts with both and reports the cosine
+similarity of each pair of vectors, plus top-k agreement of FAISS search on
+the built index. Exits non-zero if any graph falls below its threshold.
+
+Usage:
+    python check_onnx_parity.py --onnx-dir ../models/all-MiniLM-L6-v2
+"""
+
+import argparse
+import os
+import sys
+
+import faiss
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from chunk_store import ChunkStore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from onnx_embedder import OnnxEmbedder  # noqa: E402
+
+QUERIES = [
+    "How do I create a loyalty program?",
+    "What does the loyaltyProgramId field mean?",
+    "GET /v2/customers/lookup returns 404",
+    "Configure coupon series expiry",
+    "How to add a customer to a tier",
+]
+
+# Minimum cosine similarity to the torch vector for every text
+THRESHOLDS = {"model.onnx": 0.9999, "model_int8.onnx": 0.98}
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--onnx-dir", default="../models/all-MiniLM-L6-v2")
+    parser.add_argument("--model", default=None, help="Torch model to compare against (default: the exported one)")
+    parser.add_argument("--store", default="../metadata/capillary_chunks")
+    parser.add_argument("--index-path", default="../faiss_index/capillary_chunks_index.faiss")
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    store = ChunkStore(args.store)
+    rng = np.random.default_rng(0)
+    texts = QUERIES + store.get_many(rng.choice(len(store), size=min(args.chunks, len(store)), replace=False))
+    # Chunk-length text exercises truncation; short sentences exercise padding
+    texts += [" ".join(chunk.split()[:12]) for chunk in texts[len(QUERIES):len(QUERIES) + 50]]
+
+    first = OnnxEmbedder(args.onnx_dir)
+    model = SentenceTransformer(args.model or first.model_name, device="cpu")
+    reference = normalize(model.encode(texts, convert_to_numpy=True, batch_size=32))
+    index = faiss.read_index(args.index_path) if os.path.exists(args.index_path) else None
+    if index is not None and index.d != reference.shape[1]:
+        index = None
+
+    failed = False
+    print(f"{len(texts)} texts\n")
+    print(f"{'graph':<18} {'min cos':>9} {'mean cos':>9} {'top-k overlap':>14}  result")
+    for model_file, threshold in THRESHOLDS.items():
+        if not os.path.exists(os.path.join(args.onnx_dir, model_file)):
+            continue
+        vectors = normalize(OnnxEmbedder(args.onnx_dir, model_file).encode(texts))
+        cosine = np.sum(vectors * reference, axis=1)
+        overlap = float("nan")
+        if index is not None:
+            _, want = index.search(reference[:len(QUERIES)], args.k)
+            _, got = index.search(vectors[:len(QUERIES)].astype(np.float32), args.k)
+            overlap = np.mean([len(set(w) & set(g)) / args.k for w, g in zip(want, got)])
+        ok = cosine.min() >= threshold
+        failed |= not ok
+        print(f"{model_file:<18} {cosine.min():>9.5f} {cosine.mean():>9.5f} {overlap:>14.2f}  "
+              f"{'ok' if ok else f'FAIL (< {threshold})'}")
+    sys.exit(1 if failed else 0)
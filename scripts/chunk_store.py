@@ -0,0 +1,205 @@
+"""
+chunk_store.py
+--------------
+Compact on-disk store for chunk texts: one contiguous UTF-8 blob plus an
+offsets array. Both files are memory-mapped, so lookups by chunk ID are
+O(1) and every worker process shares the same page cache. Page-aware
+builds add a per-chunk source array (page, start, end) and a page table
+(url, title). Also holds the FAISS-position -> chunk-ID mapping as a
+dense int64 array.
+"""
+
+import json
+import mmap
+import os
+from typing import Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+
+
+SOURCE_DTYPE = np.dtype([("page", np.int32), ("start", np.int64), ("end", np.int64)])
+
+
+def store_paths(store_prefix: str):
+    """Return the (offsets, blob) file paths for a store prefix."""
+    return f"{store_prefix}.offsets.npy", f"{store_prefix}.bin"
+
+
+def source_paths(store_prefix: str):
+    """Return the (per-chunk source array, page table) file paths for a store prefix."""
+    return f"{store_prefix}.sources.npy", f"{store_prefix}.pages.json"
+
+
+class _SourceTable:
+    """Accumulates per-chunk (page, start, end) rows and the page (url, title) table."""
+
+    def __init__(self, rows=None, pages=None):
+        self.rows = list(rows) if rows is not None else []
+        self.pages = pages or []
+        self.page_ids = {tuple(page): i for i, page in enumerate(self.pages)}
+        self.used = bool(pages)
+
+    def add(self, chunk) -> str:
+        """Record the source of chunk (a str, or a chunk_page record) and return its text."""
+        if isinstance(chunk, str):
+            self.rows.append((-1, 0, 0))
+            return chunk
+        self.used = True
+        page = (chunk.get("url", ""), chunk.get("title", ""))
+        page_id = self.page_ids.setdefault(page, len(self.pages))
+        if page_id == len(self.pages):
+            self.pages.append(page)
+        self.rows.append((page_id, chunk.get("start", 0), chunk.get("end", 0)))
+        return chunk["text"]
+
+    def save(self, store_prefix: str):
+        rows_path, pages_path = source_paths(store_prefix)
+        if not self.used:
+            # A plain store must not pick up sources left by an earlier page-aware build
+            for path in (rows_path, pages_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+        with open(rows_path + ".tmp", "wb") as f:
+            np.save(f, np.array(self.rows, dtype=SOURCE_DTYPE))
+        with open(pages_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump([list(page) for page in self.pages], f)
+        os.replace(rows_path + ".tmp", rows_path)
+        os.replace(pages_path + ".tmp", pages_path)
+
+
+def write_chunk_store(chunks: Iterable[Union[str, dict]], store_prefix: str) -> int:
+    """
+    Writes chunks to an offsets file and a UTF-8 blob; chunk ID = position.
+    When chunks are chunking.chunk_page records, their URL, title and page
+    offsets are saved alongside so retrieval can cite sources.
+
+    Args:
+        chunks (Iterable[str | dict]): Chunk texts or records, in ID order.
+        store_prefix (str): Path prefix, e.g. "../metadata/capillary_chunks".
+
+    Returns:
+        int: Number of chunks written.
+    """
+    offsets_path, blob_path = store_paths(store_prefix)
+    offsets = [0]
+    sources = _SourceTable()
+    with open(blob_path + ".tmp", "wb") as blob:
+        for chunk in chunks:
+            offsets.append(offsets[-1] + blob.write(sources.add(chunk).encode("utf-8")))
+    with open(offsets_path + ".tmp", "wb") as f:
+        np.save(f, np.asarray(offsets, dtype=np.int64))
+    sources.save(store_prefix)
+    os.replace(blob_path + ".tmp", blob_path)
+    os.replace(offsets_path + ".tmp", offsets_path)
+    return len(offsets) - 1
+
+
+def append_chunk_store(chunks: Iterable[Union[str, dict]], store_prefix: str) -> List[int]:
+    """
+    Appends chunks to an existing store in place; existing IDs are unchanged.
+    Open readers keep working: they only see the old offsets until they reload.
+
+    Returns:
+        List[int]: Chunk IDs assigned to the appended chunks.
+    """
+    offsets_path, blob_path = store_paths(store_prefix)
+    rows_path, pages_path = source_paths(store_prefix)
+    offsets = np.load(offsets_path).tolist()
+    first_id = len(offsets) - 1
+    if os.path.exists(rows_path):
+        with open(pages_path, "r", encoding="utf-8") as f:
+            sources = _SourceTable(np.load(rows_path)[:first_id].tolist(), json.load(f))
+    else:
+        sources = _SourceTable([(-1, 0, 0)] * first_id)
+    with open(blob_path, "r+b") as blob:
+        # Drop any tail left by an append that crashed before its offsets were saved
+        blob.truncate(offsets[-1])
+        blob.seek(offsets[-1])
+        for chunk in chunks:
+            offsets.append(offsets[-1] + blob.write(sources.add(chunk).encode("utf-8")))
+    # Sources first: readers index them by chunk ID, so extra rows are harmless
+    sources.save(store_prefix)
+    with open(offsets_path + ".tmp", "wb") as f:
+        np.save(f, np.asarray(offsets, dtype=np.int64))
+    os.replace(offsets_path + ".tmp", offsets_path)
+    return list(range(first_id, len(offsets) - 1))
+
+
+def write_id_mapping(chunk_ids: Iterable[int], save_path: str):
+    """Save the FAISS position -> chunk ID mapping as a dense int64 .npy array."""
+    with open(save_path + ".tmp", "wb") as f:
+        np.save(f, np.fromiter(chunk_ids, dtype=np.int64))
+    os.replace(save_path + ".tmp", save_path)
+
+
+def load_id_mapping(path: str) -> np.ndarray:
+    """Memory-map a mapping written by write_id_mapping."""
+    return np.load(path, mmap_mode="r")
+
+
+def resolve_positions(id_mapping: np.ndarray, positions) -> np.ndarray:
+    """
+    Map FAISS result positions to chunk IDs in one vectorized step.
+    Drops the -1 padding FAISS returns when fewer than k results exist.
+    """
+    positions = np.asarray(positions, dtype=np.int64).ravel()
+    positions = positions[(positions >= 0) & (positions < len(id_mapping))]
+    return id_mapping[positions]
+
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped view of a store written by write_chunk_store.
+
+    Args:
+        store_prefix (str): Path prefix the store was written with.
+    """
+
+    def __init__(self, store_prefix: str):
+        offsets_path, blob_path = store_paths(store_prefix)
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        with open(blob_path, "rb") as f:
+            # mmap cannot map an empty file
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        self._view = memoryview(self._blob)
+        rows_path, pages_path = source_paths(store_prefix)
+        self.sources, self.pages = None, []
+        if os.path.exists(rows_path):
+            self.sources = np.load(rows_path, mmap_mode="r")
+            with open(pages_path, "r", encoding="utf-8") as f:
+                self.pages = json.load(f)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, chunk_id: int) -> str:
+        start, end = self.offsets[chunk_id], self.offsets[chunk_id + 1]
+        return str(self._view[start:end], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for chunk_id in range(len(self)):
+            yield self[chunk_id]
+
+    def source(self, chunk_id: int) -> Optional[dict]:
+        """URL, title and page offsets of a chunk, or None if the store has no sources."""
+        if self.sources is None:
+            return None
+        page, start, end = self.sources[chunk_id]
+        if page < 0:
+            return None
+        url, title = self.pages[page]
+        return {"url": url, "title": title, "start": int(start), "end": int(end)}
+
+    def records(self) -> Iterator[dict]:
+        """Yield every chunk as a dict with its text and, when known, its source fields."""
+        for chunk_id in range(len(self)):
+            yield {"text": self[chunk_id], **(self.source(chunk_id) or {})}
+
+    def get_many(self, chunk_ids: Iterable[int]) -> List[str]:
+        return [self[int(i)] for i in chunk_ids]
+
+    def close(self):
+        self._view.release()
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
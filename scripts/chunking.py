@@ -3,10 +3,17 @@ chunking.py
 ------------
 Module to split large text into semantically meaningful chunks
 with optional sentence overlap, suitable for RAG embedding.
+Page-aware chunking keeps every chunk inside one page and records
+its source URL, title and character offsets.
 """
 
+import multiprocessing
 import re
-from typing import List
+from collections import deque
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
 
 def chunk_text(text: str, chunk_size: int = 50, overlap: int = 5) -> List[str]:
     """
@@ -21,7 +28,7 @@ def chunk_text(text: str, chunk_size: int = 50, overlap: int = 5) -> List[str]:
         List[str]: List of text chunks.
     """
     # Split text into sentences
-    sentences = re.split(r'(?<=[.!?])\s+', text)
+    sentences = SENTENCE_BOUNDARY.split(text)
     
     chunks = []
     start = 0
@@ -35,11 +42,162 @@ def chunk_text(text: str, chunk_size: int = 50, overlap: int = 5) -> List[str]:
     return chunks
 
 
+def stitch_sentences(page_sentences: Iterable[List[str]]) -> Iterator[str]:
+    """
+    Yields the sentences of " ".join(texts), given SENTENCE_BOUNDARY.split(text)
+    for each text. Splitting pages independently (e.g. in worker processes) and
+    stitching here gives exactly the same sentences as splitting the joined string.
+    
+    Only the unfinished sentence at the end of each text is carried over, since
+    it may continue into the next one.
+    """
+    carry = None       # trailing, possibly unfinished sentence
+    boundary = False   # the text so far ends inside a sentence-boundary whitespace run
+    for parts in page_sentences:
+        if carry is None:
+            head = parts
+        elif boundary:
+            # The joining space and any leading whitespace extend the boundary run
+            first = parts[0].lstrip()
+            if len(parts) == 1 and not first:
+                continue
+            head = [first] + parts[1:]
+        else:
+            # Only the junction needs re-splitting; the rest of the page is unaffected
+            head = SENTENCE_BOUNDARY.split(carry + " " + parts[0]) + parts[1:]
+        yield from head[:-1]
+        carry = head[-1]
+        boundary = len(head) > 1 and not carry
+    if carry is not None:
+        yield carry
+
+
+def iter_sentences(texts: Iterable[str]) -> Iterator[str]:
+    """Yields the sentences of " ".join(texts) without building the joined string."""
+    return stitch_sentences(SENTENCE_BOUNDARY.split(text) for text in texts)
+
+
+def window_chunks(sentences: Iterable[str], chunk_size: int = 50, overlap: int = 5) -> Iterator[str]:
+    """
+    Groups a sentence stream into overlapping chunks, exactly as chunk_text does.
+    Holds at most chunk_size sentences in memory at a time.
+    """
+    step = chunk_size - overlap
+    window = []
+    skip = 0  # sentences to drop before the next window when step > chunk_size
+    for sentence in sentences:
+        if skip:
+            skip -= 1
+            continue
+        window.append(sentence)
+        if len(window) == chunk_size:
+            chunk = " ".join(window).strip()
+            if chunk:
+                yield chunk
+            skip = max(0, step - len(window))
+            window = window[step:]
+    while window:
+        chunk = " ".join(window[:chunk_size]).strip()
+        if chunk:
+            yield chunk
+        window = window[step:]
+
+
+def iter_chunks(texts: Iterable[str], chunk_size: int = 50, overlap: int = 5) -> Iterator[str]:
+    """
+    Streaming equivalent of chunk_text(" ".join(texts), chunk_size, overlap).
+    
+    Args:
+        texts (Iterable[str]): Page texts, e.g. from ingest.iter_pages.
+        chunk_size (int): Number of sentences per chunk.
+        overlap (int): Number of overlapping sentences between consecutive chunks.
+    
+    Yields:
+        str: Text chunks, in the same order chunk_text would return them.
+    """
+    return window_chunks(iter_sentences(texts), chunk_size, overlap)
+
+
+def page_title(text: str, max_length: int = 120) -> str:
+    """The scraper puts the page heading on the first line of the text."""
+    for line in text.splitlines():
+        if line.strip():
+            return line.strip()[:max_length]
+    return ""
+
+
+def chunk_page(page: dict, chunk_size: int = 50, overlap: int = 5) -> List[dict]:
+    """
+    Splits one page into overlapping sentence chunks that never cross into another page.
+    
+    Args:
+        page (dict): Scraped page with "url" and "text".
+        chunk_size (int): Number of sentences per chunk.
+        overlap (int): Number of overlapping sentences between consecutive chunks.
+    
+    Returns:
+        List[dict]: One record per chunk with "text", "url", "title" and the
+        "start" / "end" character offsets of the chunk within the page text.
+    """
+    text = page["text"]
+    title = page.get("title") or page_title(text)
+    # (start, end) character span of every sentence in the page
+    spans, pos = [], 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        spans.append((pos, match.start()))
+        pos = match.end()
+    spans.append((pos, len(text)))
+    
+    records = []
+    start = 0
+    while start < len(spans):
+        window = spans[start:start + chunk_size]
+        chunk = " ".join(text[a:b] for a, b in window).strip()
+        if chunk:
+            records.append({"text": chunk, "url": page.get("url", ""), "title": title,
+                            "start": window[0][0], "end": window[-1][1]})
+        start += chunk_size - overlap
+    return records
+
+
+def _chunk_pages(pages: List[dict], chunk_size: int, overlap: int) -> List[dict]:
+    return [record for page in pages for record in chunk_page(page, chunk_size, overlap)]
+
+
+def _ordered_map(pool, func, items: Iterable, batch_size: int, max_pending: int, *args) -> Iterator:
+    """Apply func to consecutive batches of items in the pool, yielding results in input order."""
+    items = iter(items)
+    pending = deque()
+    while True:
+        while len(pending) < max_pending:
+            batch = list(islice(items, batch_size))
+            if not batch:
+                break
+            pending.append(pool.apply_async(func, (batch,) + args))
+        if not pending:
+            return
+        yield from pending.popleft().get()
+
+
+def iter_page_chunks(pages: Iterable[dict], chunk_size: int = 50, overlap: int = 5, workers: int = 1,
+                     pages_per_task: int = 64) -> Iterator[dict]:
+    """
+    Page-aware chunking: yields chunk_page records for every page, in order.
+    Pages are independent, so with workers > 1 they are chunked in a process pool.
+    """
+    if workers <= 1:
+        for page in pages:
+            yield from chunk_page(page, chunk_size, overlap)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        yield from _ordered_map(pool, _chunk_pages, pages, pages_per_task, 2 * workers, chunk_size, overlap)
+
+
 if __name__ == "__main__":
-    with open("../data/capillary_docs.json", "r", encoding="utf-8") as f:
-        import json
-        data = json.load(f)
-    # Combine all texts into one string
-    all_text = " ".join([item["text"] for item in data])
-    chunks = chunk_text(all_text)
-    print(f"Total chunks created: {len(chunks)}")
+    # Chunk with the settings of the last build, so the count matches its chunk store
+    from ingest import iter_pages
+    from manifest import load_manifest
+    from token_chunking import iter_build_chunks
+    chunks = iter_build_chunks(iter_pages("../data/capillary_docs.json"),
+                               **load_manifest("../metadata/build_manifest.json"))
+    print(f"Total chunks created: {sum(1 for _ in chunks)}")
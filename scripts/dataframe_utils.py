@@ -1,42 +1,78 @@
 """
 dataframe_utils.py
 ------------------
-Helper module for creating Pandas DataFrame and saving ID mappings
-for chunked text and FAISS integration.
+Helper module for writing the chunk store and ID mapping for chunked text
+and FAISS integration, plus an optional Pandas DataFrame CSV of the chunks
+for inspecting a build (nothing reads it back).
 """
 
 import pandas as pd
-import json, os
-from typing import List
+import os
+from itertools import islice
+from typing import Iterable, Optional, Union
+from chunk_store import ChunkStore, write_chunk_store, write_id_mapping
 
-def create_dataframe(chunks: List[str], save_csv_path: str, save_mapping_path: str):
+def create_dataframe(chunks: Iterable[Union[str, dict]], save_mapping_path: str, save_store_prefix: str = None,
+                     save_csv_path: Optional[str] = None, batch_size: int = 1000) -> int:
     """
-    Creates a Pandas DataFrame with chunk text, using index as unique ID.
+    Writes the chunk store and ID mapping, using position as unique chunk ID,
+    and optionally a Pandas DataFrame CSV of the chunks for inspection.
+    The CSV is written in batches, so chunks may be a one-shot generator.
+    Page-aware chunk records also get url, title, start and end columns.
     
     Args:
-        chunks (List[str]): List of text chunks.
-        save_csv_path (str): Path to save the DataFrame CSV.
-        save_mapping_path (str): Path to save the ID mapping JSON.
-    """
-    df = pd.DataFrame({"text": chunks})
-    df.to_csv(save_csv_path, index=True)  # index serves as chunk ID
+        chunks (Iterable[str | dict]): Text chunks or chunking.chunk_page records.
+        save_mapping_path (str): Path to save the ID mapping (.npy int64 array).
+        save_store_prefix (str): Optional path prefix for the memory-mapped chunk store.
+        save_csv_path (str): Optional path to save the DataFrame CSV; skipped by default.
+        batch_size (int): Rows per DataFrame batch written to the CSV.
     
+    Returns:
+        int: Number of chunks written.
+    """
+    # Memory-mapped chunk store read by app.py (chunk ID = DataFrame index);
+    # written first so the CSV can be streamed back out of it
+    if save_store_prefix:
+        n_chunks = write_chunk_store(chunks, save_store_prefix)
+        chunks = ChunkStore(save_store_prefix).records()
+    else:
+        chunks = iter(chunks)
+        n_chunks = None
+
+    if save_csv_path:
+        n_chunks = write_csv(chunks, save_csv_path, batch_size)
+    elif n_chunks is None:
+        n_chunks = sum(1 for _ in chunks)
+
     # Mapping: FAISS index position -> DataFrame index
-    id_mapping = {i: i for i in range(len(chunks))}
-    with open(save_mapping_path, "w", encoding="utf-8") as f:
-        json.dump(id_mapping, f, indent=2)
+    write_id_mapping(range(n_chunks), save_mapping_path)
+    return n_chunks
+
+def write_csv(chunks: Iterable[Union[str, dict]], save_csv_path: str, batch_size: int = 1000) -> int:
+    """Streams chunks into a DataFrame CSV (index = chunk ID) and returns their number."""
+    n_chunks = 0
+    with open(save_csv_path + ".tmp", "w", encoding="utf-8", newline="") as f:
+        for batch in iter(lambda: list(islice(chunks, batch_size)), []):
+            rows = [chunk if isinstance(chunk, dict) else {"text": chunk} for chunk in batch]
+            df = pd.DataFrame(rows, index=range(n_chunks, n_chunks + len(batch)))
+            df.to_csv(f, index=True, header=n_chunks == 0)  # index serves as chunk ID
+            n_chunks += len(batch)
+        if n_chunks == 0:
+            pd.DataFrame({"text": []}).to_csv(f, index=True)
+    os.replace(save_csv_path + ".tmp", save_csv_path)
+    return n_chunks
 
 if __name__ == "__main__":
-    from chunking import chunk_text
-    import json
-    with open("../data/capillary_docs.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
-    all_text = " ".join([item["text"] for item in data])
-    chunks = chunk_text(all_text)
+    # Chunk with the settings of the last build (build_rag_pipeline.py), which embedding_index.py then embeds
+    from ingest import iter_pages
+    from manifest import load_manifest
+    from token_chunking import iter_build_chunks
+    chunks = iter_build_chunks(iter_pages("../data/capillary_docs.json"),
+                               **load_manifest("../metadata/build_manifest.json"))
     os.makedirs("../metadata", exist_ok=True)
     create_dataframe(
         chunks,
-        save_csv_path="../metadata/capillary_chunks_df.csv",
-        save_mapping_path="../metadata/capillary_chunks_id_mapping.json"
+        save_mapping_path="../metadata/capillary_chunks_id_mapping.npy",
+        save_store_prefix="../metadata/capillary_chunks"
     )
-    print("DataFrame and ID mapping saved successfully.")
+    print("Chunk store and ID mapping saved successfully.")
@@ -0,0 +1,90 @@
+"""
+embedding_cache.py
+------------------
+Persistent on-disk cache of chunk embeddings for the build pipeline.
+Vectors live in an append-only float32 matrix (memory-mapped on read) with a
+JSON index of chunk-text hash -> row, one pair of files per model name.
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Callable, List
+
+import numpy as np
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache for one model.
+
+    Args:
+        cache_dir (str): Directory holding the cache files.
+        model_name (str): Embedding model; part of the cache key.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str):
+        os.makedirs(cache_dir, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.matrix_path = os.path.join(cache_dir, f"{slug}.f32")
+        self.index_path = os.path.join(cache_dir, f"{slug}.json")
+        self.rows = {}
+        self.dim = None
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.rows, self.dim = meta["rows"], meta["dim"]
+
+    def _matrix(self) -> np.ndarray:
+        if not self.rows:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(len(self.rows), self.dim))
+
+    def get_or_encode(self, chunks: List[str], encode: Callable[[List[str]], np.ndarray],
+                      flush_every: int = 1024) -> np.ndarray:
+        """
+        Returns embeddings for chunks, calling encode only for texts not yet cached.
+
+        Args:
+            chunks (List[str]): Texts to embed.
+            encode (Callable): Maps a list of texts to a (n, d) float32 array.
+            flush_every (int): Missing texts are encoded and persisted in slices of
+                this size, so a crashed run keeps everything finished before it.
+
+        Returns:
+            np.ndarray: (len(chunks), d) float32 embeddings in input order.
+        """
+        hashes = [text_hash(chunk) for chunk in chunks]
+        missing = {}
+        for h, chunk in zip(hashes, chunks):
+            if h not in self.rows and h not in missing:
+                missing[h] = chunk
+        missing_hashes, missing_texts = list(missing), list(missing.values())
+        for start in range(0, len(missing_texts), flush_every):
+            end = start + flush_every
+            self._append(missing_hashes[start:end], encode(missing_texts[start:end]))
+        matrix = self._matrix()
+        return np.asarray(matrix[[self.rows[h] for h in hashes]], dtype=np.float32).reshape(len(chunks), -1)
+
+    def _append(self, hashes: List[str], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.dim = self.dim or vectors.shape[1]
+        n_rows = len(self.rows)
+        mode = "r+b" if os.path.exists(self.matrix_path) else "w+b"
+        with open(self.matrix_path, mode) as f:
+            # Drop rows written by a run that crashed before saving the index
+            f.truncate(n_rows * self.dim * 4)
+            f.seek(0, os.SEEK_END)
+            f.write(vectors.tobytes())
+        self.rows.update((h, n_rows + i) for i, h in enumerate(hashes))
+        with open(self.index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "rows": self.rows}, f)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def __len__(self) -> int:
+        return len(self.rows)
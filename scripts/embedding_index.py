@@ -2,51 +2,235 @@
 embedding_index.py
 ------------------
 Module to generate embeddings for text chunks and build FAISS index.
+Supports exact (Flat) and approximate (HNSW, IVF-Flat, IVF-PQ) index types.
+Large builds can embed in a process pool (one model copy per worker), with
+chunks bucketed by token length so batches carry little padding.
 """
 
+import multiprocessing
+import os
+import time
 import faiss
 import numpy as np
 from sentence_transformers import SentenceTransformer
-from typing import List
+from itertools import islice
+from typing import Iterable, List
+from embedding_cache import EmbeddingCache
+from token_chunking import count_tokens, load_tokenizer
 
-def build_faiss_index(chunks: List[str], model_name: str = "all-MiniLM-L6-v2"):
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+
+def make_index(embeddings: np.ndarray, index_type: str = "flat", nlist: int = None, nprobe: int = 16,
+               hnsw_m: int = 32, ef_construction: int = 200, ef_search: int = 64, pq_m: int = 48, pq_nbits: int = 8):
     """
-    Generates embeddings for each chunk and builds a FAISS index.
+    Creates, trains and fills an inner-product FAISS index of the requested type.
+    
+    Args:
+        embeddings (np.ndarray): Normalized float32 embeddings, shape (n, d).
+        index_type (str): One of "flat", "hnsw", "ivf_flat", "ivf_pq".
+        nlist (int): IVF cells; defaults to about 4 * sqrt(n).
+        nprobe (int): IVF cells visited per query.
+        hnsw_m (int): HNSW graph degree.
+        ef_construction (int): HNSW build-time beam width.
+        ef_search (int): HNSW query-time beam width.
+        pq_m (int): PQ sub-quantizers (must divide d).
+        pq_nbits (int): Bits per PQ code.
+    
+    Returns:
+        faiss.Index: Index containing all embeddings, with search parameters set.
+    """
+    n, dimension = embeddings.shape
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        index.hnsw.efSearch = ef_search
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = nlist or max(1, min(n // 39, int(4 * np.sqrt(n))))
+        quantizer = faiss.IndexFlatIP(dimension)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_nbits, faiss.METRIC_INNER_PRODUCT)
+        index.nprobe = min(nprobe, nlist)
+    else:
+        raise ValueError(f"Unknown index_type {index_type!r}; expected one of {INDEX_TYPES}")
+
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    return index
+
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int):
+    global _worker_model
+    import torch
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode_batch(task):
+    positions, texts = task
+    vectors = _worker_model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+    return positions, vectors
+
+
+def length_batches(lengths: np.ndarray, batch_size: int) -> List[np.ndarray]:
+    """
+    Positions grouped into batches of similar token length, longest first so the
+    slowest batches start early and the pool drains evenly.
+    """
+    order = np.argsort(-np.asarray(lengths), kind="stable")
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+class ParallelEncoder:
+    """
+    Build-time encoder spreading length-bucketed batches over worker processes.
+
+    Args:
+        model_name (str): SentenceTransformer model, loaded once per worker.
+        workers (int): Worker processes.
+        batch_size (int): Chunks per forward pass.
+        threads (int): Torch threads per worker; defaults to cores / workers.
+        bucket (bool): Sort by token length before batching; False keeps input
+            order (only useful to measure what bucketing saves).
+    """
+
+    def __init__(self, model_name: str, workers: int = 2, batch_size: int = 64, threads: int = None,
+                 bucket: bool = True):
+        self.tokenizer = load_tokenizer(model_name) if bucket else None
+        self.batch_size = batch_size
+        self.workers = workers
+        threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        # spawn: workers must not inherit a parent that may already hold torch threads
+        self.pool = multiprocessing.get_context("spawn").Pool(workers, _init_worker, (model_name, threads))
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in the pool; rows come back in input order."""
+        if self.tokenizer is not None:
+            batches = length_batches(count_tokens(self.tokenizer, texts), self.batch_size)
+        else:
+            batches = [np.arange(i, min(i + self.batch_size, len(texts))) for i in range(0, len(texts), self.batch_size)]
+        out = None
+        tasks = ((positions, [texts[i] for i in positions]) for positions in batches)
+        for positions, vectors in self.pool.imap_unordered(_encode_batch, tasks):
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[positions] = vectors
+        return out if out is not None else np.empty((0, 0), dtype=np.float32)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+def embed_chunks(chunks: Iterable[str], model_name: str = "all-MiniLM-L6-v2", cache_dir: str = None,
+                 batch_size: int = 4096, workers: int = 1) -> np.ndarray:
+    """
+    Encodes chunks with a SentenceTransformer and L2-normalizes the result.
+    Chunks are consumed batch_size at a time, so only one batch of text is
+    held in memory when chunks is a generator.
     
     Args:
-        chunks (List[str]): List of text chunks.
+        chunks (Iterable[str]): Text chunks.
         model_name (str): Name of the SentenceTransformer model.
+        cache_dir (str): Optional embedding cache directory; only chunks whose
+            text is not cached for this model are encoded.
+        batch_size (int): Chunks read per encoding batch.
+        workers (int): Encoding processes; > 1 uses a ParallelEncoder.
     
     Returns:
-        index (faiss.IndexFlatIP): FAISS index with added embeddings.
-        embeddings (np.ndarray): Array of normalized embeddings.
+        np.ndarray: float32 array of normalized embeddings, shape (len(chunks), d).
     """
-    # Load embedding model
-    model = SentenceTransformer(model_name)
+    model = None
+    encoded, encode_seconds = 0, 0.0
+
+    def encode(texts: List[str]) -> np.ndarray:
+        nonlocal model, encoded, encode_seconds
+        start = time.perf_counter()
+        # Load embedding model (only once something actually needs encoding)
+        if model is None:
+            model = ParallelEncoder(model_name, workers) if workers > 1 else SentenceTransformer(model_name)
+        
+        # Generate embeddings
+        if workers > 1:
+            embeddings = model.encode(texts)
+        else:
+            embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
+        
+        # Normalize for cosine similarity
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        encoded += len(texts)
+        encode_seconds += time.perf_counter() - start
+        return embeddings.astype(np.float32)
+
+    cache = EmbeddingCache(cache_dir, model_name) if cache_dir else None
+    cached_before = len(cache) if cache else 0
+    chunks = iter(chunks)
+    parts = []
+    try:
+        for batch in iter(lambda: list(islice(chunks, batch_size)), []):
+            parts.append(cache.get_or_encode(batch, encode) if cache else encode(batch))
+    finally:
+        if isinstance(model, ParallelEncoder):
+            model.close()
+    embeddings = np.vstack(parts) if parts else np.empty((0, 0), dtype=np.float32)
+    if encoded:
+        print(f"Embedded {encoded} chunks in {encode_seconds:.1f}s "
+              f"({encoded / encode_seconds:.0f} chunks/s, {workers} worker{'s' if workers > 1 else ''}, model load included).")
+    if cache:
+        print(f"Embedding cache: {len(cache) - cached_before} encoded, {len(embeddings)} total, {len(cache)} cached.")
+    return embeddings
+
+
+def build_faiss_index(chunks: Iterable[str], model_name: str = "all-MiniLM-L6-v2", index_type: str = "flat",
+                      cache_dir: str = None, workers: int = 1, **index_params):
+    """
+    Generates embeddings for each chunk and builds a FAISS index.
     
-    # Generate embeddings
-    embeddings = model.encode(chunks, show_progress_bar=True, convert_to_numpy=True)
+    Args:
+        chunks (Iterable[str]): Text chunks (a list, generator or ChunkStore).
+        model_name (str): Name of the SentenceTransformer model.
+        index_type (str): FAISS index type, see make_index.
+        cache_dir (str): Optional embedding cache directory, see embed_chunks.
+        workers (int): Encoding processes, see embed_chunks.
+        **index_params: Extra parameters forwarded to make_index.
     
-    # Normalize for cosine similarity
-    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    Returns:
+        index (faiss.Index): FAISS index with added embeddings.
+        embeddings (np.ndarray): Array of normalized embeddings.
+    """
+    embeddings = embed_chunks(chunks, model_name, cache_dir=cache_dir, workers=workers)
     
     # Build FAISS index
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dimension)
-    index.add(embeddings)
+    index = make_index(embeddings, index_type, **index_params)
     
     return index, embeddings
 
 if __name__ == "__main__":
     
-    from chunking import chunk_text
-    import json, os
+    from chunk_store import ChunkStore
+    from manifest import load_manifest
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Embed chunks and build the FAISS index.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--cache-dir", default="../cache/embeddings", help="Embedding cache directory ('' to disable)")
+    parser.add_argument("--workers", type=int, default=1, help="Embedding processes")
+    args = parser.parse_args()
 
-    with open("../data/capillary_docs.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
-    all_text = " ".join([item["text"] for item in data])
-    chunks = chunk_text(all_text)
-    index, embeddings = build_faiss_index(chunks)
+    # Embed the chunk store (written by build_rag_pipeline.py or dataframe_utils.py), so that
+    # FAISS position i is chunk ID i, with the model of the last build
+    model = load_manifest("../metadata/build_manifest.json").get("model", "all-MiniLM-L6-v2")
+    chunks = ChunkStore("../metadata/capillary_chunks")
+    index, embeddings = build_faiss_index(chunks, model_name=model, index_type=args.index_type,
+                                          cache_dir=args.cache_dir or None, workers=args.workers)
     
     print(f"FAISS index created with {index.ntotal} vectors.")
     
@@ -0,0 +1,88 @@
+"""
+export_onnx.py
+--------------
+Export the SentenceTransformer query embedder to ONNX for onnx_embedder.py.
+The graph maps (input_ids, attention_mask, token_type_ids) straight to the
+final sentence embedding, pooling and normalization included. With
+--quantize, a dynamically int8-quantized copy is written next to it.
+
+Usage:
+    python export_onnx.py --model all-MiniLM-L6-v2 --out ../models/all-MiniLM-L6-v2 --quantize
+"""
+
+import argparse
+import json
+import os
+
+import torch
+from sentence_transformers import SentenceTransformer
+
+
+class _SentenceEmbedding(torch.nn.Module):
+    """Wraps a SentenceTransformer so tracing sees plain tensor inputs and output."""
+
+    def __init__(self, model: SentenceTransformer):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        features = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": token_type_ids}
+        return self.model(features)["sentence_embedding"]
+
+
+def export(model_name: str, out_dir: str, quantize: bool = False, opset: int = 17) -> dict:
+    """
+    Export model_name to out_dir/model.onnx (and model_int8.onnx when quantize).
+
+    Returns:
+        dict: The embedder.json config written next to the graph.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu").eval()
+    tokenizer = model.tokenizer
+
+    sample = tokenizer(["export sample", "a slightly longer export sample sentence"], padding=True,
+                       return_tensors="pt", return_token_type_ids=True)
+    inputs = (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"])
+    dynamic = {0: "batch", 1: "tokens"}
+    with torch.no_grad():
+        torch.onnx.export(
+            _SentenceEmbedding(model),
+            inputs,
+            os.path.join(out_dir, "model.onnx"),
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["sentence_embedding"],
+            dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic, "token_type_ids": dynamic,
+                          "sentence_embedding": {0: "batch"}},
+            opset_version=opset,
+            dynamo=False,
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(os.path.join(out_dir, "model.onnx"), os.path.join(out_dir, "model_int8.onnx"),
+                         weight_type=QuantType.QInt8)
+
+    tokenizer.backend_tokenizer.save(os.path.join(out_dir, "tokenizer.json"))
+    config = {
+        "model": model_name,
+        "dim": model.get_sentence_embedding_dimension(),
+        "max_length": model.max_seq_length,
+        "pad_id": tokenizer.pad_token_id,
+        "pad_token": tokenizer.pad_token,
+        "opset": opset,
+    }
+    with open(os.path.join(out_dir, "embedder.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return config
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--out", default="../models/all-MiniLM-L6-v2")
+    parser.add_argument("--quantize", action="store_true", help="Also write a dynamic int8 model_int8.onnx")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    config = export(args.model, args.out, quantize=args.quantize, opset=args.opset)
+    print(f"Exported {config['model']} (dim {config['dim']}, max {config['max_length']} tokens) to {args.out}")
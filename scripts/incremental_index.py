@@ -0,0 +1,273 @@
+"""
+incremental_index.py
+--------------------
+Incremental rebuild of the FAISS index and chunk store after a docs refresh.
+Pages and chunks are content-hashed; only new or changed chunks are embedded,
+chunks that disappeared are removed from the index with remove_ids, and new
+chunk texts are appended to the chunk store in place. Once too much of the
+store is dead (removed chunks still take IDs and bytes), every artifact is
+rewritten with only the live chunks.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, Tuple, Union
+
+import faiss
+import numpy as np
+
+from bm25_index import write_bm25_index
+from chunk_store import ChunkStore, append_chunk_store, write_chunk_store, write_id_mapping
+
+# Rewrite the artifacts once dead chunks make up more than this share of the store
+COMPACT_DEAD_RATIO = 0.25
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def chunk_key(chunk: Union[str, dict]) -> str:
+    """
+    Hash identifying a chunk: its text, plus its source fields for page-aware
+    records, so a chunk whose page offsets moved is re-added with fresh ones
+    (the embedding cache makes re-embedding the unchanged text free).
+    """
+    if isinstance(chunk, dict) and len(chunk) > 1:
+        return content_hash(json.dumps(chunk, sort_keys=True))
+    return content_hash(chunk["text"] if isinstance(chunk, dict) else chunk)
+
+
+def load_state(state_path: str) -> dict:
+    """Load the page/chunk hash state; an absent file means a fresh state."""
+    if not os.path.exists(state_path):
+        return {"pages": {}, "chunks": {}}
+    with open(state_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state: dict, state_path: str):
+    with open(state_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(state_path + ".tmp", state_path)
+
+
+def updatable_index(index):
+    """
+    The index of a full build, made addressable by chunk ID without changing its
+    type: a flat index is wrapped in an IndexIDMap2 whose IDs are the positions;
+    IVF indexes (ivf_flat, ivf_pq) already store IDs and keep their trained
+    quantizer. HNSW graphs cannot remove vectors and need a full rebuild.
+    """
+    if isinstance(index, (faiss.IndexIDMap2, faiss.IndexIVF)):
+        return index
+    if isinstance(index, faiss.IndexFlat):
+        id_map = faiss.IndexIDMap2(faiss.IndexFlatIP(index.d))
+        id_map.add_with_ids(index.reconstruct_n(0, index.ntotal), np.arange(index.ntotal, dtype=np.int64))
+        return id_map
+    raise ValueError(f"{type(index).__name__} cannot be updated incrementally; a full rebuild "
+                     "(build_rag_pipeline.py) is required")
+
+
+def seed_state(chunks: Iterable[Union[str, dict]]) -> Dict[str, int]:
+    """Key -> chunk ID state for a store built by a full run, where chunk ID = position."""
+    state = {}
+    for chunk_id, chunk in enumerate(chunks):
+        state.setdefault(chunk_key(chunk), chunk_id)
+    return state
+
+
+def state_path_for(store_prefix: str) -> str:
+    """Hash state file kept next to a chunk store."""
+    return f"{store_prefix}_hashes.json"
+
+
+def compact(index, known: Dict[str, int], store_prefix: str, mapping_path: str,
+            model_name: str = "all-MiniLM-L6-v2", cache_dir: str = None) -> Tuple[faiss.Index, Dict[str, int]]:
+    """
+    Rewrites the chunk store, FAISS index and ID mapping with only the live
+    chunks (the values of known), renumbered 0..n-1 in their current order.
+    The index keeps its type: flat vectors are copied out of the index, while
+    an IVF index is emptied (keeping its trained quantizer) and refilled from
+    the embedding cache, since IVF-PQ only holds lossy codes.
+
+    Returns:
+        Tuple[faiss.Index, Dict[str, int]]: The compacted index and chunk key -> new chunk ID.
+    """
+    live = sorted(known.items(), key=lambda item: item[1])
+    store = ChunkStore(store_prefix)
+    if isinstance(index, faiss.IndexIVF):
+        from embedding_index import embed_chunks
+        vectors = embed_chunks((store[chunk_id] for _, chunk_id in live), model_name, cache_dir=cache_dir)
+        compacted = faiss.clone_index(index)
+        compacted.reset()
+    else:
+        vectors = np.vstack([index.reconstruct(chunk_id) for _, chunk_id in live]) if live else \
+            np.zeros((0, index.d), dtype=np.float32)
+        compacted = faiss.IndexIDMap2(faiss.IndexFlatIP(index.d))
+
+    def records():
+        for _, chunk_id in live:
+            source = store.source(chunk_id)
+            yield {"text": store[chunk_id], **source} if source else store[chunk_id]
+
+    # The old files stay mapped by open readers; the rewrite replaces them atomically
+    write_chunk_store(records(), store_prefix)
+    store.close()
+    compacted.add_with_ids(vectors, np.arange(len(live), dtype=np.int64))
+    write_id_mapping(range(len(live)), mapping_path)
+    return compacted, {h: new_id for new_id, (h, _) in enumerate(live)}
+
+
+def update_index(page_hashes: Dict[str, str], chunks: Iterable[Union[str, dict]], index_path: str, store_prefix: str,
+                 mapping_path: str, state_path: str, model_name: str = "all-MiniLM-L6-v2",
+                 cache_dir: str = None, compact_ratio: float = COMPACT_DEAD_RATIO) -> dict:
+    """
+    Brings the index, chunk store, ID mapping and BM25 index in line with the current chunks.
+
+    Args:
+        page_hashes (Dict[str, str]): URL -> content hash of every current page.
+        chunks (Iterable[str | dict]): Chunks of the current corpus; only consumed
+            when some page changed, and only new chunk texts are kept in memory.
+        index_path (str): FAISS index file to update in place.
+        store_prefix (str): Chunk store prefix to append to.
+        mapping_path (str): ID mapping file to rewrite.
+        state_path (str): JSON file holding page and chunk hashes.
+        model_name (str): SentenceTransformer used for new chunks.
+        cache_dir (str): Optional embedding cache directory, see embed_chunks.
+        compact_ratio (float): Compact (see compact) once more than this share
+            of the chunk store is dead; 0 compacts after every change.
+
+    Returns:
+        dict: Counts of changed pages and added / removed / kept chunks, the
+        dead chunks left in the store, and whether it was compacted.
+    """
+    state = load_state(state_path)
+    changed_pages = sum(1 for url, h in page_hashes.items() if state["pages"].get(url) != h)
+    changed_pages += sum(1 for url in state["pages"] if url not in page_hashes)
+    if state["chunks"] and changed_pages == 0:
+        return {"changed_pages": 0, "added": 0, "removed": 0, "kept": len(state["chunks"]), "dead": None,
+                "compacted": False}
+
+    index = updatable_index(faiss.read_index(index_path))
+    known = state["chunks"]
+    current = set()
+    new_texts = {}
+    for chunk in chunks:
+        h = chunk_key(chunk)
+        current.add(h)
+        if h not in known:
+            new_texts.setdefault(h, chunk)
+
+    removed = {h: chunk_id for h, chunk_id in known.items() if h not in current}
+    new_hashes = list(new_texts)
+
+    if removed:
+        index.remove_ids(np.asarray(list(removed.values()), dtype=np.int64))
+    if new_hashes:
+        # Imported lazily so a no-change run never loads the model
+        from embedding_index import embed_chunks
+        new_ids = append_chunk_store(new_texts.values(), store_prefix)
+        texts = (chunk["text"] if isinstance(chunk, dict) else chunk for chunk in new_texts.values())
+        index.add_with_ids(embed_chunks(texts, model_name, cache_dir=cache_dir),
+                           np.asarray(new_ids, dtype=np.int64))
+        known.update(zip(new_hashes, new_ids))
+        write_id_mapping(range(new_ids[-1] + 1), mapping_path)
+    for h in removed:
+        del known[h]
+
+    n_stored = len(ChunkStore(store_prefix))
+    compacted = n_stored - len(known) > compact_ratio * n_stored
+    if compacted:
+        index, known = compact(index, known, store_prefix, mapping_path, model_name, cache_dir)
+        n_stored = len(known)
+
+    faiss.write_index(index, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
+    # The lexical index must cover exactly the chunk IDs left in the FAISS index
+    live_ids = sorted(known.values())
+    store = ChunkStore(store_prefix)
+    write_bm25_index((store[chunk_id] for chunk_id in live_ids), store_prefix, live_ids)
+    store.close()
+    save_state({"pages": page_hashes, "chunks": known}, state_path)
+    return {"changed_pages": changed_pages, "added": len(new_hashes), "removed": len(removed),
+            "kept": len(known) - len(new_hashes), "dead": n_stored - len(known), "compacted": compacted}
+
+
+if __name__ == "__main__":
+    from artifact_versions import ARTIFACTS_DIR, version_paths
+    from ingest import iter_pages
+    from manifest import file_sha256, load_manifest, write_manifest
+    from token_chunking import iter_build_chunks
+
+    parser = argparse.ArgumentParser(description="Update a build in place after a docs refresh.")
+    parser.add_argument("--data", default="../data/capillary_docs.json")
+    parser.add_argument("--version", default=None,
+                        help="Update ../artifacts/<version>/ instead of the unversioned build")
+    parser.add_argument("--artifacts-dir", default=os.path.join("..", ARTIFACTS_DIR))
+    parser.add_argument("--cache-dir", default="../cache/embeddings", help="Embedding cache directory ('' to disable)")
+    parser.add_argument("--compact-ratio", type=float, default=COMPACT_DEAD_RATIO,
+                        help="Rewrite the artifacts once this share of the chunk store is dead")
+    args = parser.parse_args()
+
+    if args.version:
+        paths = version_paths(args.artifacts_dir, args.version)
+    else:
+        paths = {"index": "../faiss_index/capillary_chunks_index.faiss", "chunks": "../metadata/capillary_chunks",
+                 "id_mapping": "../metadata/capillary_chunks_id_mapping.npy",
+                 "manifest": "../metadata/build_manifest.json"}
+    state_path = state_path_for(paths["chunks"])
+    manifest = load_manifest(paths["manifest"])
+    if not manifest:
+        parser.error(f"No build manifest at {paths['manifest']}; run build_rag_pipeline.py first")
+    if manifest.get("index_type") == "hnsw":
+        parser.error("HNSW indexes cannot remove vectors; a full rebuild (build_rag_pipeline.py) is required")
+
+    # Two streaming passes: page hashes first, chunks (the same way the last full
+    # build did) only if something changed
+    page_hashes = {page["url"]: content_hash(page["text"]) for page in iter_pages(args.data)}
+    # Manifests older than the --chunking option were joined builds
+    chunks = iter_build_chunks(iter_pages(args.data), **{"chunking": "joined", **manifest})
+    if manifest.get("chunking") == "joined":
+        # Joined chunks run across page boundaries, so an edit shifts every later chunk
+        print("Warning: a joined build re-embeds every chunk after the first changed page; "
+              "rebuild with --chunking tokens or page for cheap updates")
+
+    # First run after a full build: adopt the existing store as the baseline, and
+    # its pages too when the build was made from this very corpus
+    if not os.path.exists(state_path):
+        store = ChunkStore(paths["chunks"])
+        built_from_data = manifest.get("corpus_sha256") == file_sha256(args.data)
+        save_state({"pages": page_hashes if built_from_data else {}, "chunks": seed_state(store.records())},
+                   state_path)
+
+    counts = update_index(
+        page_hashes,
+        chunks,
+        index_path=paths["index"],
+        store_prefix=paths["chunks"],
+        mapping_path=paths["id_mapping"],
+        state_path=state_path,
+        model_name=manifest.get("model", "all-MiniLM-L6-v2"),
+        cache_dir=args.cache_dir or None,
+        compact_ratio=args.compact_ratio,
+    )
+    if counts["added"] or counts["removed"]:
+        manifest.pop("built_at", None)
+        manifest.update(
+            corpus_sha256=file_sha256(args.data),
+            n_pages=len(page_hashes),
+            n_chunks=len(ChunkStore(paths["chunks"])),
+            n_vectors=faiss.read_index(paths["index"]).ntotal,
+        )
+        write_manifest(paths["manifest"], **manifest)
+    print(f"Pages changed: {counts['changed_pages']}, chunks added: {counts['added']}, "
+          f"removed: {counts['removed']}, unchanged: {counts['kept']}")
+    if counts["compacted"]:
+        print("Compacted the chunk store, FAISS index and ID mapping")
+    elif counts["dead"]:
+        print(f"{counts['dead']} dead chunks left in the store")
+    if counts["added"] or counts["removed"]:
+        print("A running server picks up the change on SIGHUP or POST /admin/reload")
@@ -0,0 +1,67 @@
+"""
+ingest.py
+---------
+Streaming reader for scraped corpora.
+Yields pages one at a time from either a JSON array (as written by the
+Scrapy "json" feed) or JSON Lines, so memory stays bounded by the largest
+page rather than the whole corpus.
+"""
+
+import json
+from typing import Iterator
+
+
+def iter_pages(path: str, buffer_size: int = 1 << 16) -> Iterator[dict]:
+    """
+    Yields page dicts ({"url", "text", ...}) from a corpus file.
+
+    Args:
+        path (str): ``.jsonl`` / ``.ndjson`` (one page per line) or a JSON array file.
+        buffer_size (int): Characters read from disk at a time for JSON arrays.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            return
+        yield from _iter_json_array(f, buffer_size)
+
+
+def _iter_json_array(f, buffer_size: int) -> Iterator[dict]:
+    """Incrementally decode the elements of a top-level JSON array."""
+    decoder = json.JSONDecoder()
+    buf = f.read(buffer_size).lstrip()
+    if not buf.startswith("["):
+        raise ValueError("Expected a JSON array of pages")
+    buf = buf[1:]
+    eof = False
+
+    def read_more() -> bool:
+        nonlocal buf, eof
+        more = f.read(buffer_size)
+        eof = not more
+        buf += more
+        return not eof
+
+    while True:
+        # Skip whitespace and the comma between elements
+        buf = buf.lstrip()
+        while buf.startswith(","):
+            buf = buf[1:].lstrip()
+        if not buf:
+            if eof or not read_more():
+                raise ValueError("Unterminated JSON array")
+            continue
+        if buf.startswith("]"):
+            return
+        try:
+            page, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            # Element is split across reads; pull in more text and retry
+            if eof or not read_more():
+                raise
+            continue
+        yield page
+        buf = buf[end:]
@@ -0,0 +1,57 @@
+"""
+manifest.py
+-----------
+Build manifest shared by the build pipeline and the server.
+Records the corpus hash, chunking parameters, model and artifact counts of
+one build, so the server can refuse artifacts that do not belong together.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import List
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Hash a file in blocks without reading it into memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_manifest(save_path: str, **fields) -> dict:
+    """Atomically write a manifest with the given fields plus a build timestamp."""
+    manifest = {"built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), **fields}
+    with open(save_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(save_path + ".tmp", save_path)
+    return manifest
+
+
+def load_manifest(path: str) -> dict:
+    """Return the manifest at path, or an empty dict if there is none."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_manifest(manifest: dict, **actual) -> List[str]:
+    """
+    Compare loaded artifact properties against the manifest.
+
+    Args:
+        manifest (dict): Manifest written by the build.
+        **actual: Observed values, e.g. n_vectors=index.ntotal, model="...".
+
+    Returns:
+        List[str]: One message per mismatch; empty if consistent.
+    """
+    return [
+        f"{key}: manifest says {manifest[key]!r}, loaded {value!r}"
+        for key, value in actual.items()
+        if key in manifest and manifest[key] != value
+    ]
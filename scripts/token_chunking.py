@@ -0,0 +1,241 @@
+"""
+token_chunking.py
+-----------------
+Tokenizer-aware chunking sized to the embedding model's max sequence length.
+Sentences are packed into a chunk until the next one would exceed the token
+budget, and consecutive chunks overlap by whole trailing sentences up to a
+token limit. A sentence longer than the whole budget is cut at token
+boundaries. Also reports how much of a chunk set the model truncates.
+"""
+
+import multiprocessing
+from bisect import bisect_left
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from chunking import SENTENCE_BOUNDARY, _ordered_map, iter_chunks, iter_page_chunks, page_title
+
+# all-MiniLM-L6-v2 embeds at most 256 word pieces, [CLS] and [SEP] included
+MAX_SEQ_TOKENS = 256
+
+_tokenizers = {}
+
+
+def load_tokenizer(model_name: str = "all-MiniLM-L6-v2"):
+    """Fast (offset-aware) tokenizer of a SentenceTransformer model, loaded once per process."""
+    if model_name not in _tokenizers:
+        from transformers import AutoTokenizer
+        repo = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        _tokenizers[model_name] = AutoTokenizer.from_pretrained(repo, use_fast=True)
+    return _tokenizers[model_name]
+
+
+def token_spans(tokenizer, text: str) -> List[Tuple[int, int]]:
+    """(start, end) character span of every word piece of text, special tokens excluded."""
+    encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    return encoding["offset_mapping"]
+
+
+def count_tokens(tokenizer, texts: List[str]) -> np.ndarray:
+    """Tokens the model sees for each text, special tokens included, before truncation."""
+    encodings = tokenizer(texts, add_special_tokens=True, verbose=False)
+    return np.array([len(ids) for ids in encodings["input_ids"]], dtype=np.int64)
+
+
+def chunk_page_tokens(page: dict, tokenizer, max_tokens: int = MAX_SEQ_TOKENS, overlap_tokens: int = 32) -> List[dict]:
+    """
+    Splits one page into chunks of at most max_tokens model tokens.
+
+    Args:
+        page (dict): Scraped page with "url" and "text".
+        tokenizer: Fast tokenizer of the embedding model, see load_tokenizer.
+        max_tokens (int): Token budget per chunk, special tokens included.
+        overlap_tokens (int): Most tokens of trailing sentences repeated at the
+            start of the next chunk.
+
+    Returns:
+        List[dict]: Records like chunking.chunk_page returns: "text", "url",
+        "title" and the "start" / "end" character offsets within the page.
+    """
+    text = page["text"]
+    title = page.get("title") or page_title(text)
+    budget = max_tokens - tokenizer.num_special_tokens_to_add()
+    if budget <= 0:
+        raise ValueError(f"max_tokens={max_tokens} leaves no room for text")
+
+    # Tokenize the page once; sentence token counts come from the offsets
+    offsets = token_spans(tokenizer, text)
+    token_starts = [start for start, _ in offsets]
+    # Token i begins a word if it is not glued to the previous one ("##" pieces are)
+    word_start = [i == 0 or offsets[i - 1][1] != start for i, start in enumerate(token_starts)]
+    spans, pos = [], 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        spans.append((pos, match.start()))
+        pos = match.end()
+    spans.append((pos, len(text)))
+    units = []  # (start, end, n_tokens) of each sentence, or piece of an over-long sentence
+    for start, end in spans:
+        first, last = bisect_left(token_starts, start), bisect_left(token_starts, end)
+        piece = first
+        while piece < last:
+            piece_end = min(piece + budget, last)
+            # Cut an over-long sentence before a word, so re-tokenizing the piece gives the same count
+            if piece_end < last:
+                cut = next((i for i in range(piece_end, piece, -1) if word_start[i]), piece_end)
+                piece_end = cut
+            units.append((start if piece == first else token_starts[piece],
+                          end if piece_end == last else token_starts[piece_end], piece_end - piece))
+            piece = piece_end
+        if first == last and text[start:end].strip():
+            units.append((start, end, 0))
+
+    records = []
+    first = 0
+    while first < len(units):
+        last, n_tokens = first, 0
+        while last < len(units) and n_tokens + units[last][2] <= budget:
+            n_tokens += units[last][2]
+            last += 1
+        window = units[first:last]
+        chunk = " ".join(text[a:b] for a, b, _ in window).strip()
+        if chunk:
+            records.append({"text": chunk, "url": page.get("url", ""), "title": title,
+                            "start": window[0][0], "end": window[-1][1]})
+        if last == len(units):
+            break
+        # Step back over trailing sentences that fit in the overlap, but only while the
+        # next new sentence still fits after them: a window holding nothing but the
+        # overlap would end where this one did, inside it
+        carried, following = 0, units[last][2]
+        while (last - 1 > first and carried + units[last - 1][2] <= overlap_tokens
+               and carried + units[last - 1][2] + following <= budget):
+            last -= 1
+            carried += units[last][2]
+        first = last
+    return records
+
+
+def contained_chunks(records: List[dict]) -> List[int]:
+    """
+    Positions of chunks that end no later than the chunk before them on the same
+    page, i.e. repeat a span of it instead of adding text; chunk_page_tokens
+    never produces any.
+    """
+    return [i for i in range(1, len(records))
+            if records[i]["url"] == records[i - 1]["url"] and records[i]["end"] <= records[i - 1]["end"]]
+
+
+def _chunk_pages_tokens(pages: List[dict], model_name: str, max_tokens: int, overlap_tokens: int) -> List[dict]:
+    tokenizer = load_tokenizer(model_name)
+    return [record for page in pages for record in chunk_page_tokens(page, tokenizer, max_tokens, overlap_tokens)]
+
+
+def iter_token_chunks(pages: Iterable[dict], model_name: str = "all-MiniLM-L6-v2", max_tokens: int = MAX_SEQ_TOKENS,
+                      overlap_tokens: int = 32, workers: int = 1, pages_per_task: int = 64) -> Iterator[dict]:
+    """
+    Token-budgeted, page-aware chunking: yields chunk_page_tokens records for
+    every page, in order. With workers > 1 pages are chunked in a process pool,
+    each worker loading the tokenizer once.
+    """
+    if workers <= 1:
+        tokenizer = load_tokenizer(model_name)
+        for page in pages:
+            yield from chunk_page_tokens(page, tokenizer, max_tokens, overlap_tokens)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        yield from _ordered_map(pool, _chunk_pages_tokens, pages, pages_per_task, 2 * workers,
+                                model_name, max_tokens, overlap_tokens)
+
+
+def iter_build_chunks(pages: Iterable[dict], chunking: str = "tokens", chunk_size: int = 50, overlap: int = 5,
+                      model: str = "all-MiniLM-L6-v2", max_tokens: int = MAX_SEQ_TOKENS, overlap_tokens: int = 32,
+                      workers: int = 1, **_) -> Iterator:
+    """
+    Chunk pages as build_rag_pipeline.py does for one --chunking mode:
+    "tokens" packs sentences of one page up to the model's token budget,
+    "page" keeps chunk_size-sentence chunks inside one page (both yield records
+    with url / title / offsets), "joined" chunks all page texts joined together
+    (yields strings). Other keyword arguments are ignored, so the chunks of a
+    finished build are iter_build_chunks(pages, **manifest).
+
+    With workers > 1, "tokens" chunks and tokenizes batches of pages in a
+    process pool. "page" and "joined" always run in this process: splitting
+    sentences costs less than pickling the pages to workers and the chunks back
+    (2 workers ran page chunking at 0.64x the speed of one, scripts/bench_chunking.py).
+    """
+    if chunking == "tokens":
+        return iter_token_chunks(pages, model, max_tokens=max_tokens, overlap_tokens=overlap_tokens, workers=workers)
+    if chunking == "page":
+        return iter_page_chunks(pages, chunk_size=chunk_size, overlap=overlap)
+    return iter_chunks((page["text"] for page in pages), chunk_size=chunk_size, overlap=overlap)
+
+
+def truncation_report(chunks: Iterable[str], tokenizer, max_tokens: int = MAX_SEQ_TOKENS,
+                      batch_size: int = 1024) -> dict:
+    """
+    Measures how much of each chunk the embedding model actually sees.
+
+    Args:
+        chunks (Iterable[str]): Chunk texts (a list, generator or ChunkStore).
+        tokenizer: Tokenizer of the embedding model.
+        max_tokens (int): Model max sequence length.
+        batch_size (int): Chunks tokenized per call.
+
+    Returns:
+        dict: n_chunks, truncated_chunks, truncation_rate (share of chunks cut
+        off), tokens_dropped_rate (share of all tokens never embedded), and
+        mean / p95 / max tokens per chunk.
+    """
+    counts = []
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) == batch_size:
+            counts.append(count_tokens(tokenizer, batch))
+            batch = []
+    if batch:
+        counts.append(count_tokens(tokenizer, batch))
+    counts = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+    if not len(counts):
+        return {"n_chunks": 0, "truncated_chunks": 0, "truncation_rate": 0.0, "tokens_dropped_rate": 0.0,
+                "mean_tokens": 0.0, "p95_tokens": 0, "max_tokens": 0}
+    truncated = counts > max_tokens
+    return {
+        "n_chunks": int(len(counts)),
+        "truncated_chunks": int(truncated.sum()),
+        "truncation_rate": round(float(truncated.mean()), 4),
+        "tokens_dropped_rate": round(float(np.maximum(counts - max_tokens, 0).sum() / counts.sum()), 4),
+        "mean_tokens": round(float(counts.mean()), 1),
+        "p95_tokens": int(np.percentile(counts, 95)),
+        "max_tokens": int(counts.max()),
+    }
+
+
+def format_report(report: dict, max_tokens: int = MAX_SEQ_TOKENS) -> str:
+    return (f"{report['n_chunks']} chunks, {report['truncated_chunks']} over {max_tokens} tokens "
+            f"({report['truncation_rate']:.1%}); {report['tokens_dropped_rate']:.1%} of tokens never embedded; "
+            f"mean {report['mean_tokens']:.0f}, p95 {report['p95_tokens']}, max {report['max_tokens']} tokens")
+
+
+if __name__ == "__main__":
+    import argparse
+    from chunk_store import ChunkStore
+    from ingest import iter_pages
+
+    parser = argparse.ArgumentParser(description="Compare truncation of the current chunk store with token chunking.")
+    parser.add_argument("--data", default="../data/capillary_docs.json")
+    parser.add_argument("--store", default="../metadata/capillary_chunks")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--max-tokens", type=int, default=MAX_SEQ_TOKENS)
+    parser.add_argument("--overlap-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    tokenizer = load_tokenizer(args.model)
+    store = ChunkStore(args.store)
+    print("Current store:  " + format_report(truncation_report(store, tokenizer, args.max_tokens), args.max_tokens))
+    records = list(iter_token_chunks(iter_pages(args.data), args.model, args.max_tokens, args.overlap_tokens))
+    chunks = (record["text"] for record in records)
+    print("Token chunking: " + format_report(truncation_report(chunks, tokenizer, args.max_tokens), args.max_tokens))
+    contained = contained_chunks(records)
+    assert not contained, f"{len(contained)} chunks sit inside their predecessor, first at chunk {contained[0]}"
@@ -0,0 +1,166 @@
+"""
+serve.py
+--------
+Production server for the RAG chatbot: a gunicorn master imports app.py once
+(FAISS index, chunk store, embedding model), freezes the garbage-collected
+heap and then forks the workers. Workers start serving immediately and share
+the loaded artifacts as copy-on-write pages instead of each holding a copy;
+gc.freeze keeps the collector from touching (and so un-sharing) the objects
+created before the fork. Check the effect with memory_report.py. Workers write
+their Prometheus metrics to a shared directory, so /metrics on any worker
+reports the totals of all of them.
+
+Usage:
+    python serve.py --workers 4 --bind 0.0.0.0:8000
+    python serve.py --asgi --workers 4          # asgi.py on uvicorn workers
+"""
+
+import argparse
+import atexit
+import gc
+import glob
+import os
+import shutil
+import sys
+import tempfile
+
+# Thread pools started in the master do not survive fork(); keep the native
+# libraries single-threaded and scale with workers instead
+for _var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+    os.environ.setdefault(_var, "1")
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+from gunicorn.app.base import BaseApplication  # noqa: E402
+from gunicorn.util import import_app  # noqa: E402
+
+
+def when_ready(server):
+    """Runs in the master after the app is preloaded, before any worker forks."""
+    import app as rag
+    # The master answers no requests; only workers save the answer cache (see post_worker_init)
+    atexit.unregister(rag.answer_cache.save)
+    gc.collect()
+    gc.freeze()
+    gc.enable()
+    server.log.info("Froze %d objects before forking workers", gc.get_freeze_count())
+
+
+def post_worker_init(worker):
+    """
+    Runs in each worker after gunicorn reset its signal handlers. SIGHUP sent to
+    a worker swaps in the index version ARTIFACTS_DIR/CURRENT names; a worker
+    forked after such a swap (restart, --max-requests) follows CURRENT too. On
+    exit the worker merges the answers it cached into the shared cache file.
+    """
+    import app as rag
+    from memory_report import child_pids
+    atexit.register(rag.answer_cache.save)
+    # POST /admin/reload in one worker signals its siblings to follow
+    rag.reload_peers = lambda: [pid for pid in child_pids(worker.ppid) if pid != os.getpid()]
+    rag.install_reload_signal()
+    rag.reload_in_background()
+
+
+def child_exit(server, worker):
+    """Runs in the master when a worker exits: drop its in-flight request gauge."""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    """
+    Leave a booted worker without native library teardown.
+
+    ONNX Runtime's C++ destructors hang or abort in a process forked after it
+    was imported, so run the Python exit handlers (e.g. the answer cache save)
+    and exit directly.
+    """
+    if not worker.booted:
+        return  # keep gunicorn's boot-error exit code
+    atexit._run_exitfuncs()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(0)
+
+
+def metrics_dir(path: str = None) -> str:
+    """
+    Empty directory for the per-process metric files of prometheus_client.
+
+    Args:
+        path (str): Directory to use (files of an earlier run are removed), or
+            None for a new temporary one.
+    """
+    if not path:
+        return tempfile.mkdtemp(prefix="rag-metrics-")
+    os.makedirs(path, exist_ok=True)
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+    return path
+
+
+class RagServer(BaseApplication):
+    """
+    gunicorn application that preloads one app module into the master.
+
+    Args:
+        app_uri (str): "module:variable" of the WSGI or ASGI app.
+        options (dict): gunicorn settings, e.g. {"workers": 4, "bind": "0.0.0.0:8000"}.
+    """
+
+    def __init__(self, app_uri: str, options: dict):
+        self.app_uri = app_uri
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        import app as rag
+        # Fork workers from a fully loaded master, after the loading threads are done
+        rag.loader.wait()
+        return import_app(self.app_uri)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bind", default=os.getenv("BIND", "0.0.0.0:8000"))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "4")))
+    parser.add_argument("--threads", type=int, default=8, help="Request threads per WSGI worker")
+    parser.add_argument("--asgi", action="store_true", help="Serve asgi:app on uvicorn workers")
+    parser.add_argument("--timeout", type=int, default=150, help="Seconds before a silent worker is restarted")
+    parser.add_argument("--max-requests", type=int, default=0, help="Recycle workers after this many requests")
+    parser.add_argument("--pidfile", default="serve.pid", help="Master pid, read by memory_report.py")
+    parser.add_argument("--metrics-dir", default=os.getenv("PROMETHEUS_MULTIPROC_DIR"),
+                        help="Directory for the workers' metric files (default: a new temporary one)")
+    args = parser.parse_args()
+    # Must be set before prometheus_client is first imported (by app.py, in load())
+    metrics_path = os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir(args.metrics_dir)
+
+    options = {
+        "bind": args.bind,
+        "workers": args.workers,
+        "preload_app": True,
+        "when_ready": when_ready,
+        "post_worker_init": post_worker_init,
+        "child_exit": child_exit,
+        "worker_exit": worker_exit,
+        "timeout": args.timeout,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests // 10,
+        "pidfile": args.pidfile,
+        "accesslog": "-",
+    }
+    if not args.metrics_dir:
+        options["on_exit"] = lambda server: shutil.rmtree(metrics_path, ignore_errors=True)
+    if args.asgi:
+        options["worker_class"] = "uvicorn_worker.UvicornWorker"
+    else:
+        options["worker_class"] = "gthread"
+        options["threads"] = args.threads
+
+    # No collections while loading; when_ready collects once, freezes and re-enables
+    gc.disable()
+    RagServer("asgi:app" if args.asgi else "app:app", options).run()